@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+import time
+import logging
+import threading
+
+
+class BackgroundScanner:
+    """Run a blocking scan off the Tk thread and cache the result.
+
+    Results are handed to the requester's callback on the Tk thread through
+    a TkDispatcher. Only the most recent request is answered; cancelling it
+    or making a newer one makes a scan still in flight stale, and its result
+    only refreshes the cache.
+    """
+
+    def __init__(self, scan, dispatcher, ttl=5.0):
+        self.scan = scan
+        self.dispatcher = dispatcher
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._generation = 0
+        self._callback = None
+        self._scanning = False
+        # A forced request arrived during a scan that may predate what it wants to see
+        self._rescan = False
+        self._result = None
+        self._result_time = None
+
+    def request(self, callback, force=False):
+        """Ask for a scan result, returning a ticket that can be cancelled.
+
+        callback(result, error) runs on the Tk thread. A cached result younger
+        than the TTL is delivered without scanning unless force is set; a
+        forced request made during a scan is answered by a scan started
+        after it.
+        """
+        with self._lock:
+            self._generation += 1
+            ticket = self._generation
+            self._callback = callback
+            fresh = self._result_time is not None and time.monotonic() - self._result_time < self.ttl
+            if fresh and not force:
+                self.dispatcher.call(self._deliver, ticket, callback, self._result, None)
+                return ticket
+            if self._scanning:
+                self._rescan = self._rescan or force
+            else:
+                self._scanning = True
+                threading.Thread(target=self._run, name='background-scan', daemon=True).start()
+        return ticket
+
+    def cancel(self, ticket):
+        """Drop the callback for a request if it is still the latest one"""
+        with self._lock:
+            if ticket == self._generation:
+                self._generation += 1
+                self._callback = None
+
+    def _run(self):
+        while True:
+            result, error = None, None
+            try:
+                result = self.scan()
+            except Exception as e:
+                logging.error("Background scan failed: %s", e)
+                error = e
+            with self._lock:
+                if self._rescan:
+                    # Discard this result and scan again for the forced request
+                    self._rescan = False
+                    continue
+                self._scanning = False
+                if error is None:
+                    self._result = result
+                    self._result_time = time.monotonic()
+                ticket, callback = self._generation, self._callback
+                break
+        if callback is not None:
+            self.dispatcher.call(self._deliver, ticket, callback, result, error)
+
+    def _deliver(self, ticket, callback, result, error):
+        # Runs on the Tk thread; skip answers to cancelled or superseded requests
+        if ticket == self._generation:
+            callback(result, error)
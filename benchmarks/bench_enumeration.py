@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+"""Compare USB partition enumeration strategies.
+
+Times the old path (enumerate every partition, substring-filter the sysfs
+path in Python) against list_usb_partitions (ID_BUS matched by udev).
+
+With --live both run against a real pyudev.Context on this machine, so
+libudev's own filtering is measured; the result depends on the disks present.
+    python benchmarks/bench_enumeration.py --live -n 50
+
+Otherwise a synthetic tree of many SATA/multipath disks and a few USB
+sticks is enumerated by a stand-in context that filters in Python for both
+strategies. That run does not exercise libudev: the difference it shows
+is only the cost of building and inspecting device objects in Python for
+the devices each strategy lets through.
+    python benchmarks/bench_enumeration.py --disks 500 --usb 4
+"""
+import os
+import sys
+import time
+import shutil
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from device_identity import identity_cache, list_usb_partitions
+
+
+class SyntheticAttributes:
+    def __init__(self, sys_path):
+        self.sys_path = sys_path
+
+    def get(self, name):
+        try:
+            with open(os.path.join(self.sys_path, name), 'rb') as f:
+                return f.read().strip()
+        except OSError:
+            return None
+
+
+class SyntheticDevice:
+    def __init__(self, sys_path, properties):
+        self.sys_path = sys_path
+        self.properties = properties
+        self.device_path = properties['DEVPATH']
+        self.device_type = properties.get('DEVTYPE')
+        self.device_number = 0
+        self.attributes = SyntheticAttributes(sys_path)
+
+
+class SyntheticContext:
+    """Enumerates a synthetic sysfs tree with libudev's matching rules.
+
+    uevent files are indexed once up front. Matching runs in Python here for
+    both strategies, where libudev would do it in C, so this is not a
+    measurement of libudev filtering.
+    """
+
+    def __init__(self, root):
+        self.root = root
+        self.index = {}
+        for subsystem in os.listdir(os.path.join(root, 'class')):
+            block = os.path.join(root, 'class', subsystem)
+            entries = self.index[subsystem] = []
+            for name in sorted(os.listdir(block)):
+                sys_path = os.path.join(block, name)
+                with open(os.path.join(sys_path, 'uevent')) as f:
+                    entries.append((sys_path, dict(line.rstrip('\n').split('=', 1) for line in f)))
+
+    def list_devices(self, subsystem, **properties):
+        for sys_path, values in self.index[subsystem]:
+            # libudev OR's property matches
+            if properties and not any(values.get(k) == v for k, v in properties.items()):
+                continue
+            yield SyntheticDevice(sys_path, dict(values))
+
+
+def build_tree(root, disks, usb, partitions):
+    """Create disks and partitions with uevent files under root/class/block"""
+    block = os.path.join(root, 'class', 'block')
+    os.makedirs(block)
+
+    def add(name, devpath, bus, devtype, serial=None):
+        path = os.path.join(block, name)
+        os.makedirs(path)
+        with open(os.path.join(path, 'uevent'), 'w') as f:
+            f.write(f"DEVPATH={devpath}\nDEVNAME={name}\nDEVTYPE={devtype}\nID_BUS={bus}\n")
+        if serial:
+            with open(os.path.join(path, 'serial'), 'w') as f:
+                f.write(serial)
+
+    for i in range(disks):
+        disk = f"sd{i}"
+        base = f"/devices/pci0000:00/0000:00:17.0/ata{i}/host{i}/target{i}:0:0/{i}:0:0:0/block/{disk}"
+        add(disk, base, 'ata', 'disk', serial=f"ATA{i:06d}")
+        for p in range(1, partitions + 1):
+            add(f"{disk}p{p}", f"{base}/{disk}p{p}", 'ata', 'partition')
+        add(f"dm-{i}", f"/devices/virtual/block/dm-{i}", 'dm', 'disk')
+    for i in range(usb):
+        disk = f"sdu{i}"
+        base = f"/devices/pci0000:00/0000:00:14.0/usb1/1-{i}/1-{i}:1.0/host9{i}/target9{i}:0:0/9{i}:0:0:0/block/{disk}"
+        add(disk, base, 'usb', 'disk')
+        add(f"{disk}1", f"{base}/{disk}1", 'usb', 'partition')
+
+
+def substring_scan(context):
+    """The enumeration list_usb_devices used before filtering moved to udev"""
+    devices = []
+    for device in context.list_devices(subsystem='block', DEVTYPE='partition'):
+        if 'usb' in device.device_path.lower():
+            device_id = identity_cache.get_device_id(device)
+            if device_id:
+                devices.append((device_id, device))
+    return devices
+
+
+def pushdown_scan(context):
+    devices = []
+    for device in list_usb_partitions(context):
+        device_id = identity_cache.get_device_id(device)
+        if device_id:
+            devices.append((device_id, device))
+    return devices
+
+
+def bench(label, func, context, iterations):
+    found = None
+    start = time.perf_counter()
+    for _ in range(iterations):
+        identity_cache.clear()
+        found = func(context)
+    elapsed = (time.perf_counter() - start) / iterations
+    print(f"{label:<12} {len(found)} devices  {elapsed * 1000:8.2f} ms/scan")
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--disks', type=int, default=500)
+    parser.add_argument('--usb', type=int, default=4)
+    parser.add_argument('--partitions', type=int, default=3)
+    parser.add_argument('-n', '--iterations', type=int, default=5)
+    parser.add_argument('--live', action='store_true', help="enumerate this machine's devices through libudev")
+    args = parser.parse_args()
+
+    if args.live:
+        import pyudev
+        context = pyudev.Context()
+        old = bench("substring", substring_scan, context, args.iterations)
+        new = bench("udev match", pushdown_scan, context, args.iterations)
+        print(f"speedup      {old / new:.1f}x (libudev, devices on this machine)")
+        return
+
+    root = tempfile.mkdtemp(prefix='synthetic-sysfs-')
+    try:
+        build_tree(root, args.disks, args.usb, args.partitions)
+        context = SyntheticContext(root)
+        old = bench("substring", substring_scan, context, args.iterations)
+        new = bench("udev match", pushdown_scan, context, args.iterations)
+        print(f"speedup      {old / new:.1f}x (Python object cost only, not libudev filtering)")
+    finally:
+        shutil.rmtree(root)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+"""Compare forking udevadm with in-process udev lookups for USB identity resolution.
+
+Run from the key's mount point (or pass a path on it):
+    python benchmarks/bench_identity.py /media/user/KEY -n 200
+"""
+import os
+import sys
+import time
+import argparse
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from usb_program import USBSecurityService
+from drive_discovery import find_backing_device
+
+
+def device_node(path):
+    """Get the /dev node of the block device holding a path"""
+    dev = find_backing_device(path)
+    name = os.path.basename(os.path.realpath(f"/sys/dev/block/{os.major(dev)}:{os.minor(dev)}"))
+    return os.path.join('/dev', name)
+
+
+def fork_identifier(device_path, node):
+    """Resolve the identifier the way get_usb_identifier used to"""
+    device_info = os.popen(f"udevadm info -q property -n {node}").read()
+    serial = [line.split('=')[1] for line in device_info.split('\n') if 'ID_SERIAL=' in line][0]
+    return f"{serial}_{device_path}"
+
+
+def in_process_identifier(service, device_path):
+    """Resolve the identifier through the udev database"""
+    serial = service.get_device_properties(device_path)['ID_SERIAL']
+    return f"{serial}_{device_path}"
+
+
+def bench(label, func, iterations):
+    """Time a resolver and print per-call latency"""
+    func()
+    start = time.perf_counter()
+    for _ in range(iterations):
+        func()
+    elapsed = time.perf_counter() - start
+    print(f"{label:<12} {iterations} calls  {elapsed / iterations * 1e6:10.1f} us/call")
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('path', nargs='?', default=os.getcwd(), help="path on the USB key")
+    parser.add_argument('-n', '--iterations', type=int, default=200)
+    args = parser.parse_args()
+
+    device_path = os.path.realpath(args.path)
+    service = USBSecurityService()
+    try:
+        node = device_node(device_path)
+        fork = bench("fork", lambda: fork_identifier(device_path, node), args.iterations)
+    except (IndexError, OSError) as e:
+        print(f"fork         unavailable ({e!r}); udevadm cannot resolve {device_path}")
+        fork = None
+    in_process = bench("in-process", lambda: in_process_identifier(service, device_path), args.iterations)
+    if fork:
+        print(f"speedup      {fork / in_process:.1f}x")
+
+
+if __name__ == '__main__':
+    main()
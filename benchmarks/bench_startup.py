@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""Measure time to first window and peak RSS of the GUI entry points.
+
+Each run starts the target with USB_AUTH_STARTUP_PROBE=1, which makes the app
+print a marker as soon as its first window is mapped and then exit. Targets
+are the scripts by default; pass built executables to compare bundles:
+    python benchmarks/bench_startup.py -n 5
+    python benchmarks/bench_startup.py dist/USB_Auth_System dist/USB_Auth_System/USB_Auth_System
+"""
+import os
+import sys
+import time
+import select
+import argparse
+import statistics
+import subprocess
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+DEFAULT_TARGETS = ['usb_auth_gui.py', 'usb_installer.py']
+
+
+def command_for(target):
+    """Build the command line that launches a script or executable"""
+    if target.endswith('.py'):
+        return [sys.executable, os.path.join(ROOT, target)]
+    return [os.path.abspath(target)]
+
+
+def launch(command, timeout):
+    """Run a target once, returning (seconds to first window, peak RSS in KiB)"""
+    env = dict(os.environ, USB_AUTH_STARTUP_PROBE='1')
+    start = time.perf_counter()
+    proc = subprocess.Popen(command, cwd=ROOT, env=env, stdout=subprocess.PIPE,
+                            stderr=subprocess.DEVNULL, text=True)
+    first_window = None
+    deadline = start + timeout
+    while first_window is None:
+        remaining = deadline - time.perf_counter()
+        if remaining <= 0 or not select.select([proc.stdout], [], [], remaining)[0]:
+            break
+        line = proc.stdout.readline()
+        if not line:
+            # Exited without drawing a window
+            break
+        if line.startswith('FIRST_WINDOW'):
+            first_window = time.perf_counter() - start
+    proc.stdout.close()
+    if first_window is None:
+        proc.kill()
+    # wait4 reports the peak RSS of this child alone
+    try:
+        _, status, usage = os.wait4(proc.pid, 0)
+    except ChildProcessError:
+        # Already reaped (SIGCHLD ignored), so its usage is gone
+        return first_window, None
+    proc.returncode = os.waitstatus_to_exitcode(status)
+    peak_kib = usage.ru_maxrss if sys.platform != 'darwin' else usage.ru_maxrss // 1024
+    return first_window, peak_kib
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('targets', nargs='*', default=DEFAULT_TARGETS)
+    parser.add_argument('-n', '--runs', type=int, default=5)
+    parser.add_argument('--timeout', type=float, default=60.0)
+    args = parser.parse_args()
+
+    for target in args.targets:
+        times, peaks = [], []
+        for _ in range(args.runs):
+            first_window, peak = launch(command_for(target), args.timeout)
+            if first_window is None:
+                print(f"{target}: exited or timed out ({args.timeout:.0f}s) before showing a window")
+                break
+            times.append(first_window)
+            if peak is not None:
+                peaks.append(peak)
+        if times:
+            rss = f"{max(peaks) / 1024:.1f} MiB" if peaks else "unavailable"
+            print(f"{target}: first window median {statistics.median(times) * 1000:.0f} ms "
+                  f"(min {min(times) * 1000:.0f} ms), peak RSS {rss} over {len(times)} runs")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,59 @@
+#!/usr/bin/env python3
+"""Measure token verification latency per insertion and per repeat lookup.
+
+Times a full check of each key's token against its token_binding(), then
+a repeat lookup within the same session, which TokenVerifier memoizes.
+    python benchmarks/bench_token.py --keys 1000 -n 20
+"""
+import os
+import sys
+import time
+import secrets
+import argparse
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from key_token import TokenVerifier, token_binding
+
+
+def bench(label, func, calls, iterations):
+    """Time func over iterations and print the latency per call"""
+    func()
+    best = float('inf')
+    for _ in range(iterations):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    print(f"{label:<18} {best / calls * 1e6:8.2f} us/key")
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--keys', type=int, default=1000, help="keys inserted at once")
+    parser.add_argument('-n', '--iterations', type=int, default=20)
+    args = parser.parse_args()
+
+    verifier = TokenVerifier(secrets.token_bytes(32))
+    items = []
+    for i in range(args.keys):
+        session = f"/devices/usb{i}/block/sd{i}/sd{i}1"
+        properties = {'ID_SERIAL': f"Vendor_Key_SERIAL{i:08d}-0:0", 'ID_FS_UUID': f"{i:04X}-{i:04X}"}
+        binding = token_binding(session, properties)
+        items.append((session, binding, verifier.issue(binding).encode('ascii')))
+
+    def insert():
+        for session, binding, token in items:
+            verifier.end_session(session)
+            verifier.verify(session, binding, token)
+
+    def repeat_lookup():
+        for session, binding, token in items:
+            verifier.verify(session, binding, token)
+
+    inserted = bench("insert, checked", insert, len(items), args.iterations)
+    repeated = bench("same session", repeat_lookup, len(items), args.iterations)
+    print(f"same session       {inserted / repeated:.1f}x faster than a check")
+
+
+if __name__ == '__main__':
+    main()
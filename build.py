@@ -1,8 +1,12 @@
 import PyInstaller.__main__
 import os
 import shutil
+import argparse
 
-def build_exe():
+# Dependencies bundled by hooks but never imported by usb_auth_gui.py
+EXCLUDED_MODULES = ['PIL', 'dotenv', 'cryptography']
+
+def build_exe(fast_start=False):
     # Clean previous builds
     if os.path.exists('build'):
         shutil.rmtree('build')
@@ -13,13 +17,14 @@ def build_exe():
     args = [
         'usb_auth_gui.py',  # Main script
         '--name=USB_Auth_System',  # Name of the executable
-        '--onefile',  # Create a single executable file
+        '--onedir' if fast_start else '--onefile',  # onedir skips unpacking to a temp dir on every launch
         '--windowed',  # Don't show console window
         '--icon=icon.ico',  # Application icon (if you have one)
         '--add-data=authorized_devices.txt;.',  # Include data files
         '--clean',  # Clean PyInstaller cache
         '--noconfirm',  # Replace existing build without asking
     ]
+    args += [f'--exclude-module={module}' for module in EXCLUDED_MODULES]
     
     # Run PyInstaller
     PyInstaller.__main__.run(args)
@@ -27,4 +32,7 @@ def build_exe():
     print("Build completed! Executable is in the 'dist' directory.")
 
 if __name__ == "__main__":
-    build_exe() 
\ No newline at end of file
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--fast-start', action='store_true',
+                        help="build an onedir bundle that starts without extracting itself")
+    build_exe(parser.parse_args().fast_start) 
\ No newline at end of file
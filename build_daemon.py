@@ -0,0 +1,33 @@
+import PyInstaller.__main__
+import os
+import shutil
+
+# The daemon runs headless, so none of the GUI stack is bundled
+EXCLUDED_MODULES = ['tkinter', 'customtkinter', 'PIL', 'cryptography', 'dotenv']
+
+def build_daemon():
+    # Clean previous builds
+    if os.path.exists('build'):
+        shutil.rmtree('build')
+    if os.path.exists('dist'):
+        shutil.rmtree('dist')
+        
+    # PyInstaller arguments
+    args = [
+        'usb_auth_daemon.py',  # Main script
+        '--name=usb-auth-daemon',  # Name of the executable
+        '--onedir',  # Start without unpacking to a temp dir
+        '--console',  # Log to stdout for the journal
+        '--hidden-import=usb_auth_service',  # Imported lazily by the daemon
+        '--clean',  # Clean PyInstaller cache
+        '--noconfirm',  # Replace existing build without asking
+    ]
+    args += [f'--exclude-module={module}' for module in EXCLUDED_MODULES]
+    
+    # Run PyInstaller
+    PyInstaller.__main__.run(args)
+    
+    print("Build completed! Daemon is in the 'dist' directory.")
+
+if __name__ == "__main__":
+    build_daemon()
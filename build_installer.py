@@ -1,8 +1,12 @@
 import PyInstaller.__main__
 import os
 import shutil
+import argparse
 
-def build_installer():
+# Dependencies bundled by hooks but never imported by usb_installer.py
+EXCLUDED_MODULES = ['PIL', 'dotenv']
+
+def build_installer(fast_start=False):
     # Clean previous builds
     if os.path.exists('build'):
         shutil.rmtree('build')
@@ -13,13 +17,19 @@ def build_installer():
     args = [
         'usb_installer.py',  # Main script
         '--name=USB_Security_Installer',  # Name of the executable
-        '--onefile',  # Create a single executable file
+        '--onedir' if fast_start else '--onefile',  # onedir skips unpacking to a temp dir on every launch
         '--windowed',  # Don't show console window
         '--icon=icon.ico',  # Application icon (if you have one)
         '--add-data=usb_program.py;.',  # Include the USB program
+        '--add-data=log_setup.py;.',  # and the modules it imports
+        '--add-data=fileutil.py;.',
+        '--add-data=metrics.py;.',
+        '--add-data=tracing.py;.',
+        '--add-data=drive_discovery.py;.',
         '--clean',  # Clean PyInstaller cache
         '--noconfirm',  # Replace existing build without asking
     ]
+    args += [f'--exclude-module={module}' for module in EXCLUDED_MODULES]
     
     # Run PyInstaller
     PyInstaller.__main__.run(args)
@@ -27,4 +37,7 @@ def build_installer():
     print("Build completed! Installer is in the 'dist' directory.")
 
 if __name__ == "__main__":
-    build_installer() 
\ No newline at end of file
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--fast-start', action='store_true',
+                        help="build an onedir bundle that starts without extracting itself")
+    build_installer(parser.parse_args().fast_start) 
\ No newline at end of file
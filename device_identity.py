@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+import logging
+import threading
+
+
+def resolve_device_id(device):
+    """Get unique identifier for USB device"""
+    try:
+        if device.device_type == 'partition':
+            # Partitions have no serial attribute in sysfs, so an enumerated
+            # partition is identified from enumeration data without a read
+            return device.device_path
+        # Get device serial number or UUID
+        serial = device.attributes.get('serial')
+        if serial:
+            return serial.decode('utf-8')
+        # Fallback to device path
+        return device.device_path
+    except Exception as e:
+        logging.error("Error getting device ID: %s", e)
+        return None
+
+
+def list_usb_partitions(context):
+    """Enumerate partitions on USB block devices"""
+    # udev matches ID_BUS itself, so non-USB disks never reach Python. Property
+    # matches are OR'ed by libudev, which is why DEVTYPE is checked here instead.
+    for device in context.list_devices(subsystem='block', ID_BUS='usb'):
+        if device.device_type == 'partition':
+            yield device
+
+
+class DeviceIdentityCache:
+    """Device identifiers cached by sysfs path and device number.
+
+    Entries live until a remove or change uevent is seen for the same sysfs
+    path, so repeated lookups of a present device never touch sysfs.
+    """
+
+    def __init__(self):
+        self._entries = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get_device_id(self, device):
+        """Get the cached identifier for a device, resolving it on a miss"""
+        entry = self._entries.get(device.sys_path)
+        if entry is not None and entry[0] == device.device_number:
+            self.hits += 1
+            return entry[1]
+
+        device_id = resolve_device_id(device)
+        with self._lock:
+            self.misses += 1
+            if device_id is not None:
+                self._entries[device.sys_path] = (device.device_number, device_id)
+        return device_id
+
+    def handle_event(self, device):
+        """Evict the entry for a device on remove and change uevents"""
+        if device.action in ('remove', 'change'):
+            self.evict(device)
+
+    def evict(self, device):
+        """Drop the cached identifier for a device"""
+        with self._lock:
+            self._entries.pop(device.sys_path, None)
+
+    def clear(self):
+        """Drop all cached identifiers"""
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        """Get cache size and hit/miss counters"""
+        return {'entries': len(self._entries), 'hits': self.hits, 'misses': self.misses}
+
+
+# Shared by every module that identifies devices in this process
+identity_cache = DeviceIdentityCache()
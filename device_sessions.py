@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+import threading
+
+
+class SessionTable:
+    """Authorized keys currently present, by device path and identity.
+
+    Writers serialize on a lock; readers such as the GUI thread can call
+    len(), `in` and get() without locking because each is a single dict
+    operation.
+    """
+
+    def __init__(self):
+        self._by_path = {}
+        self._by_identity = {}
+        self._lock = threading.Lock()
+
+    def add(self, device_path, device_id):
+        """Start a session, returning True if it is the first one present"""
+        with self._lock:
+            first = not self._by_path
+            old_id = self._by_path.get(device_path)
+            if old_id is not None:
+                self._discard(device_path, old_id)
+            self._by_path[device_path] = device_id
+            self._by_identity.setdefault(device_id, set()).add(device_path)
+            return first
+
+    def remove(self, device_path):
+        """End a session, returning (device_id, sessions left) or None if unknown"""
+        with self._lock:
+            device_id = self._by_path.pop(device_path, None)
+            if device_id is None:
+                return None
+            self._discard(device_path, device_id)
+            return device_id, len(self._by_path)
+
+    def remove_identity(self, device_id):
+        """End every session for an identity, returning (sessions ended, sessions left)"""
+        with self._lock:
+            paths = self._by_identity.pop(device_id, ())
+            for device_path in paths:
+                del self._by_path[device_path]
+            return len(paths), len(self._by_path)
+
+    def _discard(self, device_path, device_id):
+        paths = self._by_identity.get(device_id)
+        if paths is not None:
+            paths.discard(device_path)
+            if not paths:
+                del self._by_identity[device_id]
+
+    def get(self, device_path):
+        """Get the identity of the key at a device path"""
+        return self._by_path.get(device_path)
+
+    def identities(self):
+        """Get the identities of the keys currently present"""
+        with self._lock:
+            return set(self._by_identity)
+
+    def __contains__(self, device_path):
+        return device_path in self._by_path
+
+    def __len__(self):
+        return len(self._by_path)
@@ -0,0 +1,192 @@
+#!/usr/bin/env python3
+import os
+import sqlite3
+import logging
+import threading
+
+STORE_FILE = 'authorized_devices.db'
+LEGACY_FILE = 'authorized_devices.txt'
+
+SCHEMA_VERSION = 2
+
+# Newest change log rows kept; a reader further behind reloads everything
+CHANGE_LOG_LIMIT = 10000
+
+
+class AuthorizedDeviceStore:
+    """Authorized device IDs kept in an indexed SQLite file.
+
+    Membership checks are primary-key lookups against the memory-mapped
+    database, so the allowlist never has to be loaded into memory, and
+    register/remove touch a single row instead of rewriting the file.
+    """
+
+    def __init__(self, path=STORE_FILE, legacy_path=LEGACY_FILE, change_log_limit=CHANGE_LOG_LIMIT):
+        self.path = path
+        self.legacy_path = legacy_path
+        self.change_log_limit = change_log_limit
+        self._local = threading.local()
+        self._init_schema()
+
+    def _connect(self):
+        """Get the calling thread's database connection"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA mmap_size=67108864")
+            self._local.conn = conn
+        return conn
+
+    def _init_schema(self):
+        """Create the table and migrate the legacy text file on first use"""
+        conn = self._connect()
+        version = conn.execute("PRAGMA user_version").fetchone()[0]
+        if version >= SCHEMA_VERSION:
+            return
+        with conn:
+            conn.execute("CREATE TABLE IF NOT EXISTS devices (device_id TEXT PRIMARY KEY) WITHOUT ROWID")
+            # Change log read by running services to apply registrations incrementally
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS changes ("
+                "seq INTEGER PRIMARY KEY AUTOINCREMENT, device_id TEXT NOT NULL, added INTEGER NOT NULL)"
+            )
+            conn.execute(
+                "CREATE TRIGGER IF NOT EXISTS devices_added AFTER INSERT ON devices "
+                "BEGIN INSERT INTO changes (device_id, added) VALUES (NEW.device_id, 1); END"
+            )
+            conn.execute(
+                "CREATE TRIGGER IF NOT EXISTS devices_removed AFTER DELETE ON devices "
+                "BEGIN INSERT INTO changes (device_id, added) VALUES (OLD.device_id, 0); END"
+            )
+            conn.execute(f"PRAGMA user_version={SCHEMA_VERSION}")
+        if version == 0 and self.legacy_path and os.path.exists(self.legacy_path):
+            count = self.migrate_from_text(self.legacy_path)
+            logging.info("Migrated %s authorized devices from %s to %s", count, self.legacy_path, self.path)
+
+    def migrate_from_text(self, path):
+        """Import device IDs from a one-per-line text file"""
+        with open(path, 'r') as f:
+            return self.add_many(line.strip() for line in f)
+
+    def add(self, device_id):
+        """Add a device ID, returning False if it was already present"""
+        conn = self._connect()
+        with conn:
+            cursor = conn.execute("INSERT OR IGNORE INTO devices (device_id) VALUES (?)", (device_id,))
+            self._trim_changes(conn)
+        return cursor.rowcount > 0
+
+    def remove(self, device_id):
+        """Remove a device ID, returning False if it was not present"""
+        conn = self._connect()
+        with conn:
+            cursor = conn.execute("DELETE FROM devices WHERE device_id = ?", (device_id,))
+            self._trim_changes(conn)
+        return cursor.rowcount > 0
+
+    def add_many(self, device_ids):
+        """Add device IDs in one transaction, returning how many were new"""
+        conn = self._connect()
+        with conn:
+            cursor = conn.executemany(
+                "INSERT OR IGNORE INTO devices (device_id) VALUES (?)",
+                ((device_id,) for device_id in set(device_ids) if device_id)
+            )
+            self._trim_changes(conn)
+        return cursor.rowcount
+
+    def remove_many(self, device_ids):
+        """Remove device IDs in one transaction, returning how many were present"""
+        conn = self._connect()
+        with conn:
+            cursor = conn.executemany(
+                "DELETE FROM devices WHERE device_id = ?",
+                ((device_id,) for device_id in set(device_ids))
+            )
+            self._trim_changes(conn)
+        return cursor.rowcount
+
+    def snapshot(self):
+        """Get all device IDs and the change sequence number they reflect"""
+        conn = self._connect()
+        with conn:
+            # One read transaction so the IDs and sequence number agree
+            conn.execute("BEGIN")
+            seq = self._last_change(conn)
+            device_ids = frozenset(device_id for (device_id,) in conn.execute("SELECT device_id FROM devices"))
+        return device_ids, seq
+
+    def changes_since(self, seq):
+        """Get device IDs added and removed after a change sequence number.
+
+        Returns (added, removed, last_seq) holding only net changes: an ID
+        added and removed again since seq is in neither set. Returns None if
+        changes after seq have been trimmed from the log, in which case call
+        snapshot().
+        """
+        # Whether each changed ID was present at seq, and whether it is now
+        was_present, present = {}, {}
+        conn = self._connect()
+        with conn:
+            # One read transaction so a trim cannot land between the two queries
+            conn.execute("BEGIN")
+            oldest = conn.execute("SELECT MIN(seq) FROM changes").fetchone()[0]
+            if oldest is not None and oldest > seq + 1:
+                return None
+            for last_seq, device_id, was_added in conn.execute(
+                "SELECT seq, device_id, added FROM changes WHERE seq > ? ORDER BY seq", (seq,)
+            ):
+                seq = last_seq
+                was_present.setdefault(device_id, not was_added)
+                present[device_id] = bool(was_added)
+        added = {device_id for device_id, now in present.items() if now and not was_present[device_id]}
+        removed = {device_id for device_id, now in present.items() if not now and was_present[device_id]}
+        return added, removed, seq
+
+    def changes_for(self, device_ids, seq):
+        """Get what brings a set of IDs read at seq up to date.
+
+        Returns (added, removed, last_seq) from the change log, or from a
+        full snapshot when the reader is behind the trimmed log.
+        """
+        changes = self.changes_since(seq)
+        if changes is not None:
+            return changes
+        snapshot, seq = self.snapshot()
+        return snapshot - device_ids, device_ids - snapshot, seq
+
+    def _trim_changes(self, conn):
+        """Keep only the newest change_log_limit rows of the change log"""
+        conn.execute(
+            "DELETE FROM changes WHERE seq <= (SELECT MAX(seq) FROM changes) - ?", (self.change_log_limit,)
+        )
+
+    def _last_change(self, conn):
+        """Get the newest change sequence number"""
+        return conn.execute("SELECT COALESCE(MAX(seq), 0) FROM changes").fetchone()[0]
+
+    def __contains__(self, device_id):
+        row = self._connect().execute(
+            "SELECT 1 FROM devices WHERE device_id = ?", (device_id,)
+        ).fetchone()
+        return row is not None
+
+    def __iter__(self):
+        cursor = self._connect().execute("SELECT device_id FROM devices ORDER BY device_id")
+        for (device_id,) in cursor:
+            yield device_id
+
+    def __len__(self):
+        return self._connect().execute("SELECT COUNT(*) FROM devices").fetchone()[0]
+
+    def __bool__(self):
+        return self._connect().execute("SELECT 1 FROM devices LIMIT 1").fetchone() is not None
+
+    def close(self):
+        """Close the calling thread's connection"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
@@ -0,0 +1,178 @@
+#!/usr/bin/env python3
+import os
+import time
+import select
+import logging
+import threading
+from collections import namedtuple
+
+try:
+    import pyudev
+except ImportError:
+    pyudev = None
+
+RemovableDrive = namedtuple('RemovableDrive', ['device', 'mountpoint', 'size', 'serial'])
+
+
+def unescape_mount_path(path):
+    """Decode the octal escapes the kernel uses in mountinfo paths"""
+    return (path.replace('\\040', ' ').replace('\\011', '\t')
+                .replace('\\012', '\n').replace('\\134', '\\'))
+
+
+def read_mountinfo(path='/proc/self/mountinfo'):
+    """Yield (major:minor, mount point, mount source) for each mount"""
+    with open(path, 'r') as f:
+        for line in f:
+            fields = line.split()
+            # Optional fields end at the '-' separator, followed by fstype and source
+            source = fields[fields.index('-') + 2]
+            yield fields[2], unescape_mount_path(fields[4]), unescape_mount_path(source)
+
+
+def read_mounts(path='/proc/self/mountinfo'):
+    """Map 'major:minor' device numbers to their first mount point"""
+    mounts = {}
+    for devnum, mount_point, _ in read_mountinfo(path):
+        mounts.setdefault(devnum, mount_point)
+    return mounts
+
+
+def find_backing_device(path, mountinfo='/proc/self/mountinfo'):
+    """Get the device number of the block device holding a path"""
+    dev = os.stat(path).st_dev
+    if os.major(dev) != 0:
+        return dev
+    # Anonymous device numbers (btrfs, overlays): resolve the mount source instead
+    path = os.path.realpath(path)
+    best_mount, best_source = '', None
+    for _, mount_point, source in read_mountinfo(mountinfo):
+        if (path == mount_point or path.startswith(mount_point.rstrip('/') + '/')) and len(mount_point) > len(best_mount):
+            best_mount, best_source = mount_point, source
+    if best_source and best_source.startswith('/dev/'):
+        return os.stat(best_source).st_rdev
+    raise OSError(f"No block device found for {path}")
+
+
+def read_sysfs(path):
+    try:
+        with open(path, 'r') as f:
+            return f.read().strip()
+    except OSError:
+        return None
+
+
+def read_udev_data(devnum):
+    """Read a block device's udev properties straight from the udev database"""
+    properties = {}
+    try:
+        with open(f"/run/udev/data/b{devnum}", 'r') as f:
+            for line in f:
+                if line.startswith('E:'):
+                    key, _, value = line[2:].rstrip('\n').partition('=')
+                    properties[key] = value
+    except OSError:
+        pass
+    return properties
+
+
+def _sysfs_block_devices():
+    """Yield (name, sys_path, devnum, properties) for block devices without pyudev"""
+    for name in sorted(os.listdir('/sys/class/block')):
+        sys_path = os.path.realpath(os.path.join('/sys/class/block', name))
+        devnum = read_sysfs(os.path.join(sys_path, 'dev'))
+        if devnum:
+            yield f"/dev/{name}", sys_path, devnum, read_udev_data(devnum)
+
+
+def _udev_block_devices(context):
+    """Yield (node, sys_path, devnum, properties) for block devices from udev"""
+    for device in context.list_devices(subsystem='block'):
+        if device.device_node and device.device_number:
+            devnum = f"{os.major(device.device_number)}:{os.minor(device.device_number)}"
+            yield device.device_node, device.sys_path, devnum, device.properties
+
+
+def is_removable(sys_path, properties):
+    """Check whether a block device sits on a removable disk or a USB bus"""
+    if properties.get('ID_BUS') == 'usb':
+        return True
+    disk_path = sys_path
+    if os.path.exists(os.path.join(sys_path, 'partition')):
+        disk_path = os.path.dirname(sys_path)
+    return read_sysfs(os.path.join(disk_path, 'removable')) == '1'
+
+
+def find_linux_drives(context=None):
+    """Find removable drives from mountinfo, sysfs and the udev database"""
+    mounts = read_mounts()
+    if context is None and pyudev is not None:
+        context = pyudev.Context()
+    devices = _udev_block_devices(context) if context is not None else _sysfs_block_devices()
+    drives = []
+    for node, sys_path, devnum, properties in devices:
+        mountpoint = mounts.get(devnum)
+        # Only filesystems can take an installation, mounted or not
+        if mountpoint is None and not properties.get('ID_FS_TYPE'):
+            continue
+        if not is_removable(sys_path, properties):
+            continue
+        sectors = read_sysfs(os.path.join(sys_path, 'size'))
+        drives.append(RemovableDrive(
+            device=node,
+            mountpoint=mountpoint,
+            size=int(sectors) * 512 if sectors else None,
+            serial=properties.get('ID_SERIAL_SHORT') or properties.get('ID_SERIAL'),
+        ))
+    return drives
+
+
+class DriveMonitor:
+    """Call back when removable drives appear, disappear, mount or unmount.
+
+    Block uevents come from the udev netlink socket, and mount table changes
+    are signalled by /proc/self/mountinfo becoming exceptional in select().
+    """
+
+    def __init__(self, callback, context=None, debounce=0.3):
+        self.callback = callback
+        self.debounce = debounce
+        self.context = context or pyudev.Context()
+        self.monitor = pyudev.Monitor.from_netlink(self.context)
+        self.monitor.filter_by(subsystem='block')
+        self._stop_r, self._stop_w = os.pipe()
+        self._thread = None
+
+    def start(self):
+        self.monitor.start()
+        self._thread = threading.Thread(target=self._run, name='drive-monitor', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        os.write(self._stop_w, b'x')
+        if self._thread is not None:
+            self._thread.join()
+        os.close(self._stop_r)
+        os.close(self._stop_w)
+
+    def _run(self):
+        with open('/proc/self/mountinfo', 'r') as mountinfo:
+            mountinfo.read()
+            while True:
+                readable, _, exceptional = select.select(
+                    [self.monitor, self._stop_r], [], [mountinfo]
+                )
+                if self._stop_r in readable:
+                    return
+                if exceptional:
+                    # Re-read to re-arm the mount table notification
+                    mountinfo.seek(0)
+                    mountinfo.read()
+                # Let the rest of a hotplug or automount burst arrive
+                time.sleep(self.debounce)
+                while self.monitor.poll(timeout=0) is not None:
+                    pass
+                try:
+                    self.callback()
+                except Exception as e:
+                    logging.error("Error handling drive change: %s", e)
@@ -0,0 +1,172 @@
+#!/usr/bin/env python3
+import time
+import logging
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+DROP_OLDEST = 'oldest'
+DROP_NEWEST = 'newest'
+
+
+def merge_events(earlier, later):
+    """Pick the event that represents both of two events for one device.
+
+    A remove followed by an add becomes the add; the handler must treat an
+    add for a device path that still holds a session as replacing it.
+    """
+    if earlier is not None and later.action == 'change':
+        # A change right after add/remove adds nothing for access decisions
+        return earlier
+    return later
+
+
+class EventPipeline:
+    """Bounded, coalescing hand-off between the device monitor and handlers.
+
+    submit() never blocks the monitor. Events are merged per device as they
+    are submitted, so the queue holds at most one event per device; only
+    when more than `maxsize` devices are waiting is an add or change event
+    dropped according to the drop policy. Remove events are never dropped.
+    A coalescer thread lets a burst gather for `window` seconds, then a
+    worker pool runs the handler. Events for the same device are never
+    handled concurrently and keep their order. If given, on_handled(device,
+    seconds) is called after each handler with the time since the oldest
+    event it stands for was submitted.
+    """
+
+    def __init__(self, handler, maxsize=1024, window=0.05, workers=4, drop_policy=DROP_OLDEST, key=None,
+                 on_handled=None):
+        if drop_policy not in (DROP_OLDEST, DROP_NEWEST):
+            raise ValueError(f"Unknown drop policy: {drop_policy}")
+        self.handler = handler
+        self.maxsize = maxsize
+        self.window = window
+        self.drop_policy = drop_policy
+        self.key = key or (lambda device: device.sys_path)
+        self.on_handled = on_handled
+        # Device key -> (time submitted, event), oldest first
+        self._queue = OrderedDict()
+        self._cond = threading.Condition()
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='usb-auth-worker')
+        self._busy = {}
+        self._running = False
+        self._thread = None
+        # Backpressure metrics
+        self.submitted = 0
+        self.dropped = 0
+        self.coalesced = 0
+        self.handled = 0
+        self.max_depth = 0
+
+    @property
+    def depth(self):
+        """Number of events waiting to be coalesced"""
+        return len(self._queue)
+
+    def start(self):
+        """Start the coalescer thread"""
+        self._running = True
+        self._thread = threading.Thread(target=self._coalesce_loop, name='usb-auth-coalescer', daemon=True)
+        self._thread.start()
+
+    def stop(self, wait=True):
+        """Stop accepting events and finish the ones already queued"""
+        with self._cond:
+            self._running = False
+            self._cond.notify()
+        if self._thread is not None:
+            self._thread.join()
+        self._executor.shutdown(wait=wait)
+
+    def submit(self, device):
+        """Queue a device event without blocking, returning False if it was dropped"""
+        key = self.key(device)
+        with self._cond:
+            self.submitted += 1
+            queued = self._queue.get(key)
+            if queued is not None:
+                self.coalesced += 1
+                self._queue[key] = (queued[0], merge_events(queued[1], device))
+                return True
+            if len(self._queue) >= self.maxsize and not self._make_room(device):
+                self.dropped += 1
+                logging.warning("Event queue full, dropping %s %s", device.action, device.device_path)
+                return False
+            self._queue[key] = (time.monotonic(), device)
+            self.max_depth = max(self.max_depth, len(self._queue))
+            self._cond.notify()
+        return True
+
+    def _make_room(self, device):
+        """Drop a queued add or change to admit device, or return False to drop device instead"""
+        if self.drop_policy == DROP_NEWEST and device.action != 'remove':
+            return False
+        keys = reversed(self._queue) if self.drop_policy == DROP_NEWEST else iter(self._queue)
+        for key in keys:
+            _, queued = self._queue[key]
+            if queued.action != 'remove':
+                del self._queue[key]
+                self.dropped += 1
+                logging.warning("Event queue full, dropping %s %s", queued.action, queued.device_path)
+                return True
+        # Only removes are queued; a remove is still admitted rather than lost
+        return device.action == 'remove'
+
+    def _coalesce_loop(self):
+        while True:
+            with self._cond:
+                while self._running and not self._queue:
+                    self._cond.wait()
+                if not self._running and not self._queue:
+                    return
+            # Give the rest of a burst (hub, multi-partition stick) time to arrive
+            time.sleep(self.window)
+            with self._cond:
+                batch, self._queue = self._queue, OrderedDict()
+            for key, (submitted, device) in batch.items():
+                self._dispatch(key, submitted, device)
+
+    def _dispatch(self, key, submitted, device):
+        """Run the handler for a device, after any event still running for it"""
+        with self._cond:
+            pending = self._busy.get(key)
+            if pending is not None:
+                # Replace the queued follow-up; only the latest state matters
+                if pending:
+                    self.coalesced += 1
+                    earlier, pending_device = pending[0]
+                    submitted, device = earlier, merge_events(pending_device, device)
+                self._busy[key] = [(submitted, device)]
+                return
+            self._busy[key] = []
+        self._executor.submit(self._handle, key, submitted, device)
+
+    def _handle(self, key, submitted, device):
+        while device is not None:
+            try:
+                self.handler(device)
+            except Exception as e:
+                logging.error("Error handling device event: %s", e)
+            self.handled += 1
+            if self.on_handled is not None:
+                self.on_handled(device, time.monotonic() - submitted)
+            with self._cond:
+                pending = self._busy[key]
+                if pending:
+                    submitted, device = pending.pop()
+                    self._busy[key] = []
+                else:
+                    device = None
+                    del self._busy[key]
+
+    def stats(self):
+        """Get queue depth and backpressure counters"""
+        return {
+            'depth': self.depth,
+            'max_depth': self.max_depth,
+            'submitted': self.submitted,
+            'dropped': self.dropped,
+            'coalesced': self.coalesced,
+            'handled': self.handled,
+        }
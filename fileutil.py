@@ -0,0 +1,163 @@
+#!/usr/bin/env python3
+import os
+import time
+import errno
+import shutil
+import hashlib
+import tempfile
+
+COPY_CHUNK_SIZE = 8 * 1024 * 1024
+
+# Errors meaning the kernel cannot copy between these two files
+KERNEL_COPY_UNSUPPORTED = {errno.EXDEV, errno.ENOSYS, errno.EINVAL, errno.EOPNOTSUPP, errno.EBADF}
+
+
+def fsync_dir(path):
+    """Flush a directory entry change (create, rename) to disk"""
+    if os.name != 'posix':
+        return
+    fd = os.open(path or '.', os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def atomic_write(path, data, mode=0o644):
+    """Replace a file with data so readers see either the old or new contents"""
+    directory = os.path.dirname(os.path.abspath(path))
+    if isinstance(data, str):
+        data = data.encode('utf-8')
+    fd, tmp_path = tempfile.mkstemp(prefix=f".{os.path.basename(path)}.", dir=directory)
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.chmod(tmp_path, mode)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+        raise
+    fsync_dir(directory)
+
+
+class CachedFile:
+    """Parsed contents of a file, re-read only when it changes on disk.
+
+    Each get() costs one stat(); the file is read again only when its
+    device, inode, size or modification time differ from the last read.
+    set() writes atomically and keeps the new value without re-reading it.
+    """
+
+    def __init__(self, path, load, dump, default=None, mode=0o644):
+        self.path = path
+        self.load = load
+        self.dump = dump
+        self.default = default
+        self.mode = mode
+        self.reads = 0
+        self._signature = False
+        self._value = default
+
+    def _stat_signature(self, st):
+        return (st.st_dev, st.st_ino, st.st_size, st.st_mtime_ns)
+
+    def get(self):
+        """Get the parsed contents, or the default if the file does not exist"""
+        try:
+            signature = self._stat_signature(os.stat(self.path))
+        except FileNotFoundError:
+            signature = None
+        if signature == self._signature:
+            return self._value
+        if signature is None:
+            self._value = self.default
+        else:
+            with open(self.path, 'rb') as f:
+                # Signature of what was actually read, in case it changed since the stat
+                signature = self._stat_signature(os.fstat(f.fileno()))
+                self._value = self.load(f.read())
+            self.reads += 1
+        self._signature = signature
+        return self._value
+
+    def set(self, value):
+        """Atomically replace the file with a new value"""
+        atomic_write(self.path, self.dump(value), self.mode)
+        self._value = value
+        self._signature = self._stat_signature(os.stat(self.path))
+
+
+def hash_file(path, chunk_size=COPY_CHUNK_SIZE, uncached=False):
+    """Get the SHA-256 digest of a file, optionally bypassing cached pages"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        if uncached and hasattr(os, 'posix_fadvise'):
+            # Drop clean cached pages so the read really comes from the device
+            os.posix_fadvise(f.fileno(), 0, 0, os.POSIX_FADV_DONTNEED)
+        buffer = bytearray(chunk_size)
+        view = memoryview(buffer)
+        while True:
+            n = f.readinto(buffer)
+            if not n:
+                break
+            digest.update(view[:n])
+    return digest.hexdigest()
+
+
+def _kernel_copy(src_fd, dst_fd, count):
+    """Copy up to count bytes in the kernel, returning bytes copied or None if unsupported"""
+    for copy in (getattr(os, 'copy_file_range', None), getattr(os, 'sendfile', None)):
+        if copy is None:
+            continue
+        try:
+            if copy is os.sendfile:
+                return copy(dst_fd, src_fd, None, count)
+            return copy(src_fd, dst_fd, count)
+        except OSError as e:
+            if e.errno not in KERNEL_COPY_UNSUPPORTED:
+                raise
+    return None
+
+
+def copy_verified(src, dst, progress=None, chunk_size=COPY_CHUNK_SIZE):
+    """Copy a file durably and check the copy against the source.
+
+    Data moves in large chunks through copy_file_range or sendfile where the
+    kernel supports it, with a read/write loop otherwise. The file and its
+    directory are fsynced, then the copy is read back from the device and
+    compared with the source digest. progress(done, total, bytes_per_sec)
+    is called after each chunk. Returns the SHA-256 hex digest.
+    """
+    total = os.path.getsize(src)
+    # Hashing first also pulls the source into the page cache for the copy
+    source_digest = hash_file(src, chunk_size)
+    started = time.monotonic()
+    done = 0
+    kernel_copy = True
+    with open(src, 'rb') as fsrc, open(dst, 'wb') as fdst:
+        buffer = bytearray(chunk_size)
+        while done < total:
+            n = _kernel_copy(fsrc.fileno(), fdst.fileno(), min(chunk_size, total - done)) if kernel_copy else None
+            if n is None:
+                kernel_copy = False
+                fsrc.seek(done)
+                fdst.seek(done)
+                n = fsrc.readinto(buffer)
+                fdst.write(memoryview(buffer)[:n])
+            if not n:
+                break
+            done += n
+            if progress is not None:
+                elapsed = time.monotonic() - started
+                progress(done, total, done / elapsed if elapsed > 0 else 0.0)
+        fdst.flush()
+        os.fsync(fdst.fileno())
+    shutil.copystat(src, dst)
+    fsync_dir(os.path.dirname(os.path.abspath(dst)))
+
+    if hash_file(dst, chunk_size, uncached=True) != source_digest:
+        raise OSError(errno.EIO, f"Verification failed: {dst} does not match {src}")
+    return source_digest
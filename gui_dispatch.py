@@ -0,0 +1,50 @@
+#!/usr/bin/env python3
+import time
+import queue
+import tkinter
+
+
+class TkDispatcher:
+    """Run callables on the Tk thread on behalf of other threads.
+
+    Calls are queued and a virtual event wakes the Tk loop to run them, so
+    the GUI reacts within a frame and does no periodic polling while idle.
+    """
+
+    EVENT = '<<TkDispatch>>'
+
+    def __init__(self, root):
+        self.root = root
+        self._queue = queue.SimpleQueue()
+        root.bind(self.EVENT, self._drain, add='+')
+
+    def call(self, func, *args):
+        """Schedule func(*args) on the Tk thread"""
+        self._queue.put((func, args))
+        try:
+            self.root.event_generate(self.EVENT, when='tail')
+        except (tkinter.TclError, RuntimeError):
+            # Window already destroyed or main loop gone
+            pass
+
+    def _drain(self, event=None):
+        while True:
+            try:
+                func, args = self._queue.get_nowait()
+            except queue.Empty:
+                return
+            func(*args)
+
+
+def report_first_window(root):
+    """Print a marker once the first window is drawn, then close it.
+
+    Used by benchmarks/bench_startup.py to time startup.
+    """
+    def on_map(event):
+        if event.widget is root:
+            root.update_idletasks()
+            print(f"FIRST_WINDOW {time.process_time():.3f}", flush=True)
+            root.after_idle(root.destroy)
+
+    root.bind("<Map>", on_map, add="+")
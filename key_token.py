@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+import os
+import re
+import hmac
+import logging
+import secrets
+import hashlib
+import threading
+from fileutil import atomic_write
+
+# Written to the root of the key's filesystem by `setup_usb.py issue-token`
+TOKEN_FILE = '.usb_auth_token'
+TOKEN_VERSION = 'v1'
+# Tokens come from untrusted media: read a bounded amount and accept only this form
+TOKEN_PATTERN = re.compile(rb'v1\.[0-9a-f]{64}')
+TOKEN_MAX_BYTES = 128
+SECRET_FILE = 'auth_secret.key'
+SECRET_BYTES = 32
+
+
+def load_secret(path=SECRET_FILE):
+    """Load the host's token secret, creating it on first use"""
+    try:
+        with open(path, 'rb') as f:
+            return f.read()
+    except FileNotFoundError:
+        secret = secrets.token_bytes(SECRET_BYTES)
+        atomic_write(path, secret, mode=0o600)
+        logging.info("Created token secret %s", path)
+        return secret
+
+
+def token_binding(device_id, properties):
+    """Get what a key's token is bound to: its device ID, the stick's serial
+    and its filesystem UUID, or None if udev reports no serial or UUID.
+
+    The device ID of a partition is its sysfs path, which names the USB port
+    rather than the stick; the serial and UUID tie the token to the stick.
+    """
+    serial = properties.get('ID_SERIAL')
+    fs_uuid = properties.get('ID_FS_UUID')
+    if not serial or not fs_uuid:
+        return None
+    return '\0'.join((device_id, serial, fs_uuid))
+
+
+def read_token(mountpoint):
+    """Read the token bytes from a mounted key, or None if it has none"""
+    try:
+        with open(os.path.join(mountpoint, TOKEN_FILE), 'rb') as f:
+            return f.read(TOKEN_MAX_BYTES).strip()
+    except OSError:
+        return None
+
+
+def write_token(mountpoint, token):
+    """Store a token on a mounted key"""
+    atomic_write(os.path.join(mountpoint, TOKEN_FILE), token + '\n')
+
+
+class TokenVerifier:
+    """Issues and checks HMAC-SHA256 tokens over a key's token_binding().
+
+    A token is a static bearer credential, not a challenge-response: a copy
+    of the token file passes on any stick that reports the same serial and
+    filesystem UUID.
+
+    Results are memoized per session (a device path) until end_session(),
+    so a key is checked once per insertion however often it is looked up.
+    """
+
+    def __init__(self, secret):
+        self._secret = secret
+        self._sessions = {}
+        self._lock = threading.Lock()
+        self.verifications = 0
+        self.memo_hits = 0
+
+    def _mac(self, binding):
+        mac = hmac.new(self._secret, TOKEN_VERSION.encode(), hashlib.sha256)
+        mac.update(b'\0' + binding.encode('utf-8', 'surrogateescape'))
+        return mac.hexdigest()
+
+    def issue(self, binding):
+        """Create the token for a binding"""
+        return f"{TOKEN_VERSION}.{self._mac(binding)}"
+
+    def check(self, binding, token):
+        """Check token bytes against a binding without memoizing the result.
+
+        Anything that is not a well-formed token is simply invalid.
+        """
+        self.verifications += 1
+        if not binding or not isinstance(token, bytes) or not TOKEN_PATTERN.fullmatch(token):
+            return False
+        return hmac.compare_digest(token, self.issue(binding).encode('ascii'))
+
+    def verify(self, session, binding, token):
+        """Check a token once per session and binding"""
+        entry = self._sessions.get(session)
+        if entry is not None and entry[0] == binding and entry[1] == token:
+            self.memo_hits += 1
+            return entry[2]
+        valid = self.check(binding, token)
+        with self._lock:
+            self._sessions[session] = (binding, token, valid)
+        return valid
+
+    def end_session(self, session):
+        """Forget the result for a session so the next insertion is checked again"""
+        with self._lock:
+            self._sessions.pop(session, None)
+
+    def stats(self):
+        """Get verification counts"""
+        return {
+            'verifications': self.verifications,
+            'memo_hits': self.memo_hits,
+            'sessions': len(self._sessions),
+        }
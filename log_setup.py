@@ -0,0 +1,179 @@
+#!/usr/bin/env python3
+import json
+import time
+import queue
+import atexit
+import logging
+import threading
+from collections import deque
+import logging.handlers
+
+TEXT_FORMAT = '%(asctime)s - %(levelname)s - %(message)s'
+
+# Logger for routine per-tick messages, the only ones repeat and rate filters apply to
+HEARTBEAT_LOGGER = 'usb_auth.heartbeat'
+
+# Standard LogRecord attributes; anything else was passed through `extra`
+RECORD_ATTRIBUTES = set(vars(logging.LogRecord('', 0, '', 0, '', None, None))) | {'message', 'asctime'}
+
+
+class JsonFormatter(logging.Formatter):
+    """Format records as one JSON object per line, including `extra` fields"""
+
+    def format(self, record):
+        entry = {
+            'time': self.formatTime(record),
+            'level': record.levelname,
+            'logger': record.name,
+            'thread': record.threadName,
+            'message': record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in RECORD_ATTRIBUTES:
+                entry[key] = value
+        if record.exc_text:
+            entry['exception'] = record.exc_text
+        return json.dumps(entry, default=str)
+
+
+class RateLimitFilter(logging.Filter):
+    """Token bucket per message template, counting what it suppresses.
+
+    Keyed on the unformatted message, so "Device %s authenticated" is one
+    bucket whatever the device. The next record let through carries the
+    number dropped since the previous one as `suppressed`. Warnings and
+    errors always pass.
+    """
+
+    def __init__(self, rate=10.0, burst=20):
+        super().__init__()
+        self.rate = rate
+        self.burst = burst
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def filter(self, record):
+        if record.levelno >= logging.WARNING:
+            return True
+        key = (record.levelno, record.msg)
+        now = time.monotonic()
+        with self._lock:
+            tokens, last, suppressed = self._buckets.get(key, (self.burst, now, 0))
+            tokens = min(self.burst, tokens + (now - last) * self.rate)
+            if tokens < 1:
+                self._buckets[key] = (tokens, now, suppressed + 1)
+                return False
+            self._buckets[key] = (tokens - 1, now, 0)
+        if suppressed:
+            record.suppressed = suppressed
+        return True
+
+
+class RepeatFilter(logging.Filter):
+    """Drop messages that repeat a short cycle, reporting the count on the next new one.
+
+    Once a cycle of up to `max_period` records has been seen twice in a row,
+    further repeats are dropped until something different is logged; a
+    message logged every tick is kept twice, then dropped. Only records
+    from `logger_name` below WARNING are dropped; all others pass and
+    break the cycle.
+    """
+
+    def __init__(self, logger_name, max_period=4):
+        super().__init__()
+        self.logger_name = logger_name
+        self.max_period = max_period
+        self._history = deque(maxlen=2 * max_period)
+        self._repeats = 0
+        self._lock = threading.Lock()
+
+    def _repeats_cycle(self, key):
+        history = self._history
+        for period in range(1, self.max_period + 1):
+            # The last two cycles match and this record starts a third
+            if len(history) < 2 * period or history[-period] != key:
+                continue
+            if all(history[-i] == history[-i - period] for i in range(1, period + 1)):
+                return True
+        return False
+
+    def filter(self, record):
+        key = (record.levelno, record.msg, record.args)
+        droppable = record.levelno < logging.WARNING and record.name == self.logger_name
+        with self._lock:
+            repeated = droppable and self._repeats_cycle(key)
+            self._history.append(key)
+            if repeated:
+                self._repeats += 1
+                return False
+            repeats, self._repeats = self._repeats, 0
+        if repeats:
+            record.previous_repeated = repeats
+        return True
+
+
+class NonBlockingQueueHandler(logging.handlers.QueueHandler):
+    """Queue handler that drops records instead of blocking when the queue is full"""
+
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record):
+        # Only merge the arguments here; full formatting happens on the listener thread
+        record = logging.makeLogRecord(vars(record))
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+def configure_logging(log_file, console=True, level=logging.INFO, max_bytes=5 * 1024 * 1024,
+                      backup_count=5, when=None, rate=10.0, burst=20, queue_size=10000):
+    """Route logging through a background thread writing JSON to a rotating file.
+
+    Rotates by size, or by time when `when` is given (as for
+    TimedRotatingFileHandler). Callers only filter and enqueue, so the hot
+    path never waits on disk or console I/O. Repeats are suppressed and
+    rate limited only for the HEARTBEAT_LOGGER; every other record,
+    including access decisions, is always written. Returns the started
+    listener.
+    """
+    if when:
+        file_handler = logging.handlers.TimedRotatingFileHandler(log_file, when=when, backupCount=backup_count)
+    else:
+        file_handler = logging.handlers.RotatingFileHandler(log_file, maxBytes=max_bytes, backupCount=backup_count)
+    file_handler.setFormatter(JsonFormatter())
+    handlers = [file_handler]
+    if console:
+        console_handler = logging.StreamHandler()
+        console_handler.setFormatter(logging.Formatter(TEXT_FORMAT))
+        handlers.append(console_handler)
+
+    log_queue = queue.Queue(maxsize=queue_size)
+    queue_handler = NonBlockingQueueHandler(log_queue)
+    queue_handler.addFilter(RepeatFilter(HEARTBEAT_LOGGER))
+    logging.getLogger(HEARTBEAT_LOGGER).addFilter(RateLimitFilter(rate, burst))
+
+    root = logging.getLogger()
+    root.setLevel(level)
+    root.addHandler(queue_handler)
+
+    listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=True)
+    listener.start()
+
+    def stop_listener():
+        # Flush whatever is still queued unless the caller already stopped it
+        if listener._thread is not None:
+            listener.stop()
+
+    atexit.register(stop_listener)
+    return listener
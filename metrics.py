@@ -0,0 +1,205 @@
+#!/usr/bin/env python3
+import os
+import logging
+import threading
+from bisect import bisect_left
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# Latency buckets in seconds, from a cached lookup up to a slow unlock
+DEFAULT_BUCKETS = (0.00001, 0.00005, 0.0001, 0.0005, 0.001, 0.005, 0.01,
+                   0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def escape_label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def format_labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{name}="{escape_label(value)}"' for name, value in labels.items()) + '}'
+
+
+def format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _PerThread:
+    """Cells written only by their own thread and summed when scraped.
+
+    Updating a metric is then a plain increment on a thread-local list,
+    with no lock and no contention between the threads that report it.
+    """
+
+    def __init__(self, size):
+        self._size = size
+        self._cells = []
+        self._local = threading.local()
+        self._lock = threading.Lock()
+
+    def cell(self):
+        try:
+            return self._local.cell
+        except AttributeError:
+            cell = self._local.cell = [0] * self._size
+            with self._lock:
+                self._cells.append(cell)
+            return cell
+
+    def totals(self):
+        with self._lock:
+            cells = list(self._cells)
+        return [sum(values) for values in zip(*cells)] if cells else [0] * self._size
+
+
+class Counter:
+    kind = 'counter'
+
+    def __init__(self, name, help, labels=None):
+        self.name = name
+        self.help = help
+        self.labels = labels or {}
+        self._cells = _PerThread(1)
+
+    def inc(self, amount=1):
+        self._cells.cell()[0] += amount
+
+    @property
+    def value(self):
+        return self._cells.totals()[0]
+
+    def samples(self):
+        yield self.name, self.labels, self.value
+
+
+class Histogram:
+    kind = 'histogram'
+
+    def __init__(self, name, help, buckets=DEFAULT_BUCKETS, labels=None):
+        self.name = name
+        self.help = help
+        self.labels = labels or {}
+        self.buckets = tuple(sorted(buckets))
+        # One count per bucket, then +Inf, then the sum of observed values
+        self._cells = _PerThread(len(self.buckets) + 2)
+
+    def observe(self, value):
+        cell = self._cells.cell()
+        cell[bisect_left(self.buckets, value)] += 1
+        cell[-1] += value
+
+    def samples(self):
+        totals = self._cells.totals()
+        cumulative = 0
+        for bound, count in zip(self.buckets + (float('inf'),), totals):
+            cumulative += count
+            yield f"{self.name}_bucket", dict(self.labels, le=format_value(bound)), cumulative
+        yield f"{self.name}_sum", self.labels, totals[-1]
+        yield f"{self.name}_count", self.labels, cumulative
+
+
+class Collected:
+    """A value read from its owner when scraped, costing nothing in between"""
+
+    def __init__(self, name, help, func, kind='gauge', labels=None):
+        self.name = name
+        self.help = help
+        self.func = func
+        self.kind = kind
+        self.labels = labels or {}
+
+    def samples(self):
+        yield self.name, self.labels, self.func()
+
+
+class MetricsRegistry:
+    """Metrics by name and labels, rendered in the Prometheus text format"""
+
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        """Add a metric, replacing any with the same name and labels"""
+        with self._lock:
+            self._metrics[(metric.name, tuple(sorted(metric.labels.items())))] = metric
+        return metric
+
+    def counter(self, name, help, labels=None):
+        return self.register(Counter(name, help, labels))
+
+    def histogram(self, name, help, buckets=DEFAULT_BUCKETS, labels=None):
+        return self.register(Histogram(name, help, buckets, labels))
+
+    def collect(self, name, help, func, kind='gauge', labels=None):
+        return self.register(Collected(name, help, func, kind, labels))
+
+    def render(self):
+        """Get every metric in the Prometheus text exposition format"""
+        with self._lock:
+            metrics = sorted(self._metrics.items())
+        lines = []
+        family = None
+        for (name, _), metric in metrics:
+            if name != family:
+                family = name
+                lines.append(f"# HELP {name} {metric.help}")
+                lines.append(f"# TYPE {name} {metric.kind}")
+            try:
+                for sample, labels, value in metric.samples():
+                    lines.append(f"{sample}{format_labels(labels)} {format_value(value)}")
+            except Exception as e:
+                logging.error("Error collecting metric %s: %s", name, e)
+        return '\n'.join(lines) + '\n'
+
+
+# Shared by the modules in this process
+registry = MetricsRegistry()
+
+
+def start_metrics_server(address, metrics=registry):
+    """Serve metrics over HTTP at 'host:port', or at a Unix socket path.
+
+    Returns the server; call shutdown() on it to stop serving.
+    """
+    # Imported here so processes that never serve metrics do not load them
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+    from socketserver import ThreadingUnixStreamServer
+
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split('?')[0] not in ('/', '/metrics'):
+                self.send_error(404)
+                return
+            body = metrics.render().encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', CONTENT_TYPE)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    class UnixMetricsServer(ThreadingUnixStreamServer):
+        daemon_threads = True
+
+        def get_request(self):
+            # Unix socket peers have no address for the request handler to log
+            request, _ = super().get_request()
+            return request, ('local', 0)
+
+    if address.startswith('/') or address.startswith('.'):
+        if os.path.exists(address):
+            os.unlink(address)
+        server = UnixMetricsServer(address, MetricsHandler)
+    else:
+        host, _, port = address.rpartition(':')
+        server = ThreadingHTTPServer((host or '127.0.0.1', int(port)), MetricsHandler)
+        server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name='metrics-server', daemon=True).start()
+    logging.info("Serving metrics at %s", address)
+    return server
@@ -1,7 +1,17 @@
 #!/usr/bin/env python3
 import os
+import io
 import sys
+import csv
+import json
+import time
+import argparse
 import pyudev
+from device_identity import identity_cache, list_usb_partitions
+from device_store import AuthorizedDeviceStore
+from fileutil import atomic_write
+from drive_discovery import read_mounts
+from key_token import TokenVerifier, load_secret, write_token, token_binding
 import logging
 from datetime import datetime
 
@@ -22,63 +32,105 @@ class USBSetup:
         self.load_authorized_devices()
 
     def load_authorized_devices(self):
-        """Load existing authorized devices"""
+        """Open the authorized device store"""
         try:
-            if os.path.exists('authorized_devices.txt'):
-                with open('authorized_devices.txt', 'r') as f:
-                    self.authorized_devices = set(line.strip() for line in f)
+            self.authorized_devices = AuthorizedDeviceStore()
         except Exception as e:
-            logging.error(f"Error loading authorized devices: {e}")
-
-    def save_authorized_devices(self):
-        """Save authorized devices to file"""
-        try:
-            with open('authorized_devices.txt', 'w') as f:
-                for device_id in self.authorized_devices:
-                    f.write(f"{device_id}\n")
-            logging.info("Authorized devices saved successfully")
-        except Exception as e:
-            logging.error(f"Error saving authorized devices: {e}")
+            logging.error("Error loading authorized devices: %s", e)
 
     def get_device_id(self, device):
         """Get unique identifier for USB device"""
-        try:
-            serial = device.attributes.get('serial')
-            if serial:
-                return serial.decode('utf-8')
-            return device.device_path
-        except Exception as e:
-            logging.error(f"Error getting device ID: {e}")
-            return None
+        return identity_cache.get_device_id(device)
+
+    def iter_usb_devices(self):
+        """Yield connected USB devices as they are discovered"""
+        for device in list_usb_partitions(self.context):
+            device_id = self.get_device_id(device)
+            if device_id:
+                yield device_id, device
 
     def list_usb_devices(self):
         """List all connected USB devices"""
-        devices = []
-        for device in self.context.list_devices(subsystem='block', DEVTYPE='partition'):
-            if 'usb' in device.device_path.lower():
-                device_id = self.get_device_id(device)
-                if device_id:
-                    devices.append((device_id, device))
-        return devices
+        return list(self.iter_usb_devices())
 
     def register_device(self, device_id):
         """Register a new USB device"""
-        if device_id not in self.authorized_devices:
-            self.authorized_devices.add(device_id)
-            self.save_authorized_devices()
-            logging.info(f"Device {device_id} registered successfully")
+        if self.authorized_devices.add(device_id):
+            logging.info("Device %s registered successfully", device_id)
             return True
         return False
 
     def remove_device(self, device_id):
         """Remove a registered USB device"""
-        if device_id in self.authorized_devices:
-            self.authorized_devices.remove(device_id)
-            self.save_authorized_devices()
-            logging.info(f"Device {device_id} removed successfully")
+        if self.authorized_devices.remove(device_id):
+            logging.info("Device %s removed successfully", device_id)
             return True
         return False
 
+    def register_devices(self, device_ids):
+        """Register many USB devices in one transaction"""
+        count = self.authorized_devices.add_many(device_ids)
+        logging.info("Registered %s new devices", count)
+        return count
+
+    def remove_devices(self, device_ids):
+        """Remove many registered USB devices in one transaction"""
+        count = self.authorized_devices.remove_many(device_ids)
+        logging.info("Removed %s devices", count)
+        return count
+
+    def read_device_file(self, path):
+        """Read device IDs from the first column of a CSV or plain text file"""
+        device_ids = set()
+        with open(path, 'r', newline='') as f:
+            for row in csv.reader(f):
+                if row and row[0].strip() and row[0].strip() != 'device_id':
+                    device_ids.add(row[0].strip())
+        return device_ids
+
+    def import_devices(self, path, remove=False):
+        """Register (or remove) every device ID listed in a file"""
+        device_ids = self.read_device_file(path)
+        if remove:
+            return len(device_ids), self.remove_devices(device_ids)
+        return len(device_ids), self.register_devices(device_ids)
+
+    def export_devices(self, path):
+        """Write all registered device IDs to a CSV file atomically"""
+        buffer = io.StringIO()
+        writer = csv.writer(buffer, lineterminator='\n')
+        writer.writerow(['device_id'])
+        count = 0
+        for device_id in self.authorized_devices:
+            writer.writerow([device_id])
+            count += 1
+        atomic_write(path, buffer.getvalue())
+        logging.info("Exported %s devices to %s", count, path)
+        return count
+
+    def issue_tokens(self, device_ids):
+        """Write a token to each connected key with one of the given IDs.
+
+        Returns {device_id: mountpoint} for the keys that received a token;
+        a key must be mounted, and udev must report its serial and
+        filesystem UUID, which the token is bound to.
+        """
+        verifier = TokenVerifier(load_secret())
+        mounts = read_mounts()
+        issued = {}
+        for device_id, device in self.iter_usb_devices():
+            if device_id not in device_ids or device_id in issued:
+                continue
+            number = device.device_number
+            mountpoint = mounts.get(f"{os.major(number)}:{os.minor(number)}")
+            binding = token_binding(device_id, device.properties)
+            if mountpoint is None or binding is None:
+                continue
+            write_token(mountpoint, verifier.issue(binding))
+            logging.info("Issued token for %s at %s", device_id, mountpoint)
+            issued[device_id] = mountpoint
+        return issued
+
     def run(self):
         """Interactive setup process"""
         print("\n=== USB Authentication Setup ===")
@@ -164,9 +216,149 @@ class USBSetup:
                 print("\nSetup interrupted by user")
                 break
             except Exception as e:
-                logging.error(f"Error during setup: {e}")
+                logging.error("Error during setup: %s", e)
                 print(f"An error occurred: {e}")
 
-if __name__ == "__main__":
+# Exit codes for the command-line interface (argparse uses 2 for usage errors)
+EXIT_OK = 0
+EXIT_FAILED = 1
+
+def emit(args, record, text):
+    """Print one result as a JSON line or as text"""
+    if args.json:
+        print(json.dumps(record), flush=True)
+    else:
+        print(text, flush=True)
+
+def throughput(count, started):
+    """Get elapsed seconds and keys per second for a batch"""
+    elapsed = time.perf_counter() - started
+    return elapsed, (count / elapsed if elapsed > 0 else float('inf'))
+
+def cmd_list(setup, args):
+    found = 0
+    for device_id, device in setup.iter_usb_devices():
+        found += 1
+        registered = device_id in setup.authorized_devices
+        emit(args, {
+            'device_id': device_id,
+            'device_node': device.device_node,
+            'device_path': device.device_path,
+            'registered': registered,
+        }, f"{device_id}\t{device.device_node}\t{'registered' if registered else 'unregistered'}")
+    if not found and not args.json:
+        print("No USB devices found")
+    return EXIT_OK
+
+def cmd_register(setup, args):
+    status = EXIT_OK
+    for device_id in args.device_ids:
+        registered = setup.register_device(device_id)
+        if not registered:
+            status = EXIT_FAILED
+        emit(args, {'device_id': device_id, 'registered': registered},
+             f"{device_id}: {'registered' if registered else 'already registered'}")
+    return status
+
+def cmd_remove(setup, args):
+    status = EXIT_OK
+    for device_id in args.device_ids:
+        removed = setup.remove_device(device_id)
+        if not removed:
+            status = EXIT_FAILED
+        emit(args, {'device_id': device_id, 'removed': removed},
+             f"{device_id}: {'removed' if removed else 'not registered'}")
+    return status
+
+def cmd_status(setup, args):
+    connected = [device_id for device_id, _ in setup.iter_usb_devices()]
+    authorized = [device_id for device_id in connected if device_id in setup.authorized_devices]
+    emit(args, {
+        'registered': len(setup.authorized_devices),
+        'connected': connected,
+        'authorized_connected': authorized,
+    }, f"{len(setup.authorized_devices)} registered, {len(connected)} connected, "
+       f"{len(authorized)} authorized key(s) present")
+    return EXIT_OK if authorized else EXIT_FAILED
+
+def cmd_issue_token(setup, args):
+    issued = setup.issue_tokens(set(args.device_ids))
+    status = EXIT_OK
+    for device_id in args.device_ids:
+        mountpoint = issued.get(device_id)
+        if mountpoint is None:
+            status = EXIT_FAILED
+        emit(args, {'device_id': device_id, 'mountpoint': mountpoint, 'issued': mountpoint is not None},
+             f"{device_id}: {f'token written to {mountpoint}' if mountpoint else 'not connected, not mounted or without a serial and filesystem UUID'}")
+    return status
+
+def cmd_import(setup, args):
+    started = time.perf_counter()
+    read, changed = setup.import_devices(args.file, remove=args.remove)
+    elapsed, rate = throughput(changed, started)
+    verb = "Removed" if args.remove else "Registered"
+    emit(args, {'read': read, verb.lower(): changed, 'seconds': elapsed, 'keys_per_second': rate},
+         f"Read {read} unique device IDs from {args.file}\n"
+         f"{verb} {changed} devices in {elapsed:.3f}s ({rate:.0f} keys/s)")
+    return EXIT_OK
+
+def cmd_export(setup, args):
+    started = time.perf_counter()
+    count = setup.export_devices(args.file)
+    elapsed, rate = throughput(count, started)
+    emit(args, {'exported': count, 'seconds': elapsed, 'keys_per_second': rate},
+         f"Exported {count} devices in {elapsed:.3f}s ({rate:.0f} keys/s)")
+    return EXIT_OK
+
+def main():
+    # Shared by every command so --json also works after the command name;
+    # suppressed when absent so it cannot reset a --json given before it
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument('--json', action='store_true', default=argparse.SUPPRESS,
+                        help="print one JSON object per line")
+    parser = argparse.ArgumentParser(
+        description="USB Authentication Setup. Runs the interactive menu when no command is given.",
+        epilog="Exit status: 0 on success, 1 if any device was unchanged or no authorized key "
+               "is present (status), 2 on usage errors."
+    )
+    parser.add_argument('--json', action='store_true', help="print one JSON object per line")
+    commands = parser.add_subparsers(dest='command')
+    commands.add_parser('list', parents=[common], help="list connected USB devices as they are found")
+    register_parser = commands.add_parser('register', parents=[common], help="register device IDs")
+    register_parser.add_argument('device_ids', nargs='+', metavar='DEVICE_ID')
+    remove_parser = commands.add_parser('remove', parents=[common], help="remove registered device IDs")
+    remove_parser.add_argument('device_ids', nargs='+', metavar='DEVICE_ID')
+    commands.add_parser('status', parents=[common], help="show registered and connected devices")
+    token_parser = commands.add_parser('issue-token', parents=[common],
+                                       help="write an authentication token to connected keys")
+    token_parser.add_argument('device_ids', nargs='+', metavar='DEVICE_ID')
+    import_parser = commands.add_parser('import', parents=[common],
+                                        help="register device IDs from a CSV or text file")
+    import_parser.add_argument('file')
+    import_parser.add_argument('--remove', action='store_true', help="remove the listed devices instead")
+    export_parser = commands.add_parser('export', parents=[common], help="write registered device IDs to a CSV file")
+    export_parser.add_argument('file')
+    args = parser.parse_args()
+
     setup = USBSetup()
-    setup.run() 
\ No newline at end of file
+    handlers = {
+        'list': cmd_list,
+        'register': cmd_register,
+        'remove': cmd_remove,
+        'status': cmd_status,
+        'issue-token': cmd_issue_token,
+        'import': cmd_import,
+        'export': cmd_export,
+    }
+    if args.command is None:
+        setup.run()
+        return EXIT_OK
+    try:
+        return handlers[args.command](setup, args)
+    except Exception as e:
+        logging.error("Error running %s: %s", args.command, e)
+        emit(args, {'error': str(e)}, f"An error occurred: {e}")
+        return EXIT_FAILED
+
+if __name__ == "__main__":
+    sys.exit(main())
\ No newline at end of file
@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+import os
+import time
+import ctypes
+import ctypes.util
+import select
+import struct
+import logging
+import threading
+
+# inotify event masks from <sys/inotify.h>
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_CLOEXEC = os.O_CLOEXEC
+
+EVENT_HEADER = struct.Struct('iIII')
+
+
+class StoreWatcher:
+    """Call back when a file, or its SQLite WAL, changes on disk.
+
+    Uses inotify on the containing directory where available and falls back
+    to comparing modification times every few seconds elsewhere.
+    """
+
+    def __init__(self, path, callback, debounce=0.1, poll_interval=2.0):
+        self.path = os.path.abspath(path)
+        self.callback = callback
+        self.debounce = debounce
+        self.poll_interval = poll_interval
+        self._names = {os.path.basename(self.path), os.path.basename(self.path) + '-wal'}
+        self._stop_r, self._stop_w = os.pipe()
+        self._thread = None
+        self._fd = None
+
+    def start(self):
+        """Start watching in a background thread.
+
+        The watch is in place when this returns, so a caller that re-reads
+        the store afterwards cannot miss a change.
+        """
+        self._fd = self._inotify_init()
+        self._thread = threading.Thread(target=self._run, name='store-watcher', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Stop watching and wait for the thread to exit"""
+        os.write(self._stop_w, b'x')
+        if self._thread is not None:
+            self._thread.join()
+        os.close(self._stop_r)
+        os.close(self._stop_w)
+
+    def _run(self):
+        fd = self._fd
+        try:
+            if fd is not None:
+                self._watch_inotify(fd)
+            else:
+                self._watch_mtime()
+        finally:
+            if fd is not None:
+                os.close(fd)
+
+    def _inotify_init(self):
+        """Set up an inotify watch on the store's directory, or return None"""
+        try:
+            libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+            fd = libc.inotify_init1(IN_CLOEXEC)
+            if fd < 0:
+                raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+            mask = IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE
+            if libc.inotify_add_watch(fd, os.path.dirname(self.path).encode(), mask) < 0:
+                os.close(fd)
+                raise OSError(ctypes.get_errno(), "inotify_add_watch failed")
+            return fd
+        except (OSError, AttributeError, TypeError) as e:
+            logging.info("inotify unavailable (%s), polling %s for changes", e, self.path)
+            self._last_mtimes = self._mtimes()
+            return None
+
+    def _watch_inotify(self, fd):
+        while True:
+            ready, _, _ = select.select([fd, self._stop_r], [], [])
+            if self._stop_r in ready:
+                return
+            if self._matches(os.read(fd, 4096)):
+                # Let a burst of writes from one transaction settle
+                time.sleep(self.debounce)
+                self._drain(fd)
+                self._notify()
+
+    def _matches(self, data):
+        """Check whether a buffer of inotify events names the store"""
+        offset = 0
+        while offset < len(data):
+            _, _, _, length = EVENT_HEADER.unpack_from(data, offset)
+            offset += EVENT_HEADER.size
+            name = data[offset:offset + length].rstrip(b'\0').decode(errors='replace')
+            offset += length
+            if name in self._names:
+                return True
+        return False
+
+    def _drain(self, fd):
+        """Discard events queued while debouncing"""
+        while select.select([fd], [], [], 0)[0]:
+            os.read(fd, 4096)
+
+    def _watch_mtime(self):
+        last = self._last_mtimes
+        while not select.select([self._stop_r], [], [], self.poll_interval)[0]:
+            current = self._mtimes()
+            if current != last:
+                last = current
+                self._notify()
+
+    def _mtimes(self):
+        mtimes = []
+        for name in sorted(self._names):
+            try:
+                mtimes.append(os.stat(os.path.join(os.path.dirname(self.path), name)).st_mtime_ns)
+            except OSError:
+                mtimes.append(None)
+        return mtimes
+
+    def _notify(self):
+        try:
+            self.callback()
+        except Exception as e:
+            logging.error("Error handling store change: %s", e)
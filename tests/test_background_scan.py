@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+import os
+import sys
+import queue
+import threading
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from background_scan import BackgroundScanner
+
+
+class ImmediateDispatcher:
+    """Runs dispatched calls on the calling thread"""
+
+    def call(self, func, *args):
+        func(*args)
+
+
+class GatedScan:
+    """A scan that returns how many scans had started, once allowed to finish"""
+
+    def __init__(self):
+        self.started = 0
+        self.gates = queue.SimpleQueue()
+
+    def __call__(self):
+        self.started += 1
+        number = self.started
+        self.gates.get(timeout=5)
+        return number
+
+
+class BackgroundScannerTest(unittest.TestCase):
+    def setUp(self):
+        self.scan = GatedScan()
+        self.scanner = BackgroundScanner(self.scan, ImmediateDispatcher())
+        self.results = queue.SimpleQueue()
+
+    def callback(self, result, error):
+        self.results.put(result)
+
+    def test_cached_result_is_delivered_without_scanning(self):
+        self.scan.gates.put(None)
+        self.scanner.request(self.callback)
+        self.assertEqual(self.results.get(timeout=5), 1)
+        self.scanner.request(self.callback)
+        self.assertEqual(self.results.get(timeout=5), 1)
+        self.assertEqual(self.scan.started, 1)
+
+    def test_forced_request_during_scan_rescans(self):
+        self.scanner.request(self.callback)
+        self.scanner.request(self.callback, force=True)
+        self.scan.gates.put(None)
+        self.scan.gates.put(None)
+        self.assertEqual(self.results.get(timeout=5), 2)
+        self.assertTrue(self.results.empty())
+        # The stale first result was not cached either
+        self.scanner.request(self.callback)
+        self.assertEqual(self.results.get(timeout=5), 2)
+
+    def test_unforced_request_during_scan_shares_it(self):
+        self.scanner.request(self.callback)
+        self.scanner.request(self.callback)
+        self.scan.gates.put(None)
+        self.assertEqual(self.results.get(timeout=5), 1)
+        self.assertEqual(self.scan.started, 1)
+
+    def test_cancelled_request_is_not_answered(self):
+        ticket = self.scanner.request(self.callback)
+        self.scanner.cancel(ticket)
+        self.scan.gates.put(None)
+        for thread in threading.enumerate():
+            if thread.name == 'background-scan':
+                thread.join(timeout=5)
+        self.assertTrue(self.results.empty())
+
+
+if __name__ == '__main__':
+    unittest.main()
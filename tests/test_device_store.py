@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from device_store import AuthorizedDeviceStore
+
+
+class StoreTestCase(unittest.TestCase):
+    change_log_limit = 3
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.store = AuthorizedDeviceStore(os.path.join(self.directory.name, 'devices.db'), legacy_path=None,
+                                           change_log_limit=self.change_log_limit)
+
+    def tearDown(self):
+        self.store.close()
+        self.directory.cleanup()
+
+    def oldest_change(self):
+        return self.store._connect().execute("SELECT MIN(seq) FROM changes").fetchone()[0]
+
+
+class ChangesSinceTest(StoreTestCase):
+    def test_changes_are_reported_after_seq(self):
+        self.store.add('a')
+        _, seq = self.store.snapshot()
+        self.store.add('b')
+        self.store.remove('a')
+        added, removed, last_seq = self.store.changes_since(seq)
+        self.assertEqual((added, removed), ({'b'}, {'a'}))
+        self.assertEqual(last_seq, 3)
+
+    def test_no_changes(self):
+        self.store.add('a')
+        _, seq = self.store.snapshot()
+        self.assertEqual(self.store.changes_since(seq), (set(), set(), seq))
+
+    def test_added_then_removed_is_no_change(self):
+        _, seq = self.store.snapshot()
+        self.store.add('a')
+        self.store.remove('a')
+        added, removed, last_seq = self.store.changes_since(seq)
+        self.assertEqual((added, removed), (set(), set()))
+        self.assertEqual(last_seq, 2)
+
+    def test_removed_then_added_is_no_change(self):
+        self.store.add('a')
+        _, seq = self.store.snapshot()
+        self.store.remove('a')
+        self.store.add('a')
+        self.assertEqual(self.store.changes_since(seq)[:2], (set(), set()))
+
+    def test_log_is_trimmed_to_limit(self):
+        self.store.add_many(['a', 'b', 'c', 'd', 'e'])
+        self.store.add('f')
+        count = self.store._connect().execute("SELECT COUNT(*) FROM changes").fetchone()[0]
+        self.assertEqual(count, self.change_log_limit)
+
+    def test_reader_exactly_at_trim_boundary(self):
+        for device_id in 'abcdef':
+            self.store.add(device_id)
+        boundary = self.oldest_change() - 1
+        added, removed, last_seq = self.store.changes_since(boundary)
+        self.assertEqual((added, removed), ({'d', 'e', 'f'}, set()))
+        self.assertEqual(last_seq, 6)
+
+    def test_reader_past_trim_boundary(self):
+        for device_id in 'abcdef':
+            self.store.add(device_id)
+        self.assertIsNone(self.store.changes_since(self.oldest_change() - 2))
+
+
+class ChangesForTest(StoreTestCase):
+    def test_uses_change_log_when_caught_up(self):
+        self.store.add('a')
+        device_ids, seq = self.store.snapshot()
+        self.store.add('b')
+        self.assertEqual(self.store.changes_for(device_ids, seq), ({'b'}, set(), 2))
+
+    def test_falls_back_to_snapshot_past_trim_boundary(self):
+        self.store.add_many(['a', 'b'])
+        device_ids, seq = self.store.snapshot()
+        for device_id in 'cdef':
+            self.store.add(device_id)
+        self.store.remove('a')
+        self.assertIsNone(self.store.changes_since(seq))
+        added, removed, last_seq = self.store.changes_for(device_ids, seq)
+        self.assertEqual((added, removed), ({'c', 'd', 'e', 'f'}, {'a'}))
+        self.assertEqual(last_seq, self.store.snapshot()[1])
+
+    def test_snapshot_diff_hides_added_then_removed(self):
+        device_ids, seq = self.store.snapshot()
+        self.store.add('a')
+        for device_id in 'bcd':
+            self.store.add(device_id)
+        self.store.remove('a')
+        self.assertIsNone(self.store.changes_since(seq))
+        self.assertEqual(self.store.changes_for(device_ids, seq)[:2], ({'b', 'c', 'd'}, set()))
+
+    def test_applied_changes_match_snapshot(self):
+        device_ids, seq = self.store.snapshot()
+        device_ids = set(device_ids)
+        for step in range(20):
+            self.store.add(f"dev{step}")
+            if step % 3 == 0:
+                self.store.remove(f"dev{step // 2}")
+            if step % 4 == 0:
+                added, removed, seq = self.store.changes_for(device_ids, seq)
+                device_ids.difference_update(removed)
+                device_ids.update(added)
+        added, removed, seq = self.store.changes_for(device_ids, seq)
+        device_ids.difference_update(removed)
+        device_ids.update(added)
+        self.assertEqual((device_ids, seq), (set(self.store.snapshot()[0]), self.store.snapshot()[1]))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+import os
+import sys
+import time
+import threading
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from event_pipeline import EventPipeline, DROP_OLDEST, DROP_NEWEST
+
+
+class FakeDevice:
+    def __init__(self, path, action):
+        self.sys_path = path
+        self.device_path = path
+        self.action = action
+
+    def __repr__(self):
+        return f"FakeDevice({self.sys_path!r}, {self.action!r})"
+
+
+def queued(pipeline):
+    """Get (path, action) for each event waiting in a pipeline that was not started"""
+    return [(device.sys_path, device.action) for _, device in pipeline._queue.values()]
+
+
+class RecordingHandler:
+    """Records handled events and whether two ran at once for the same device"""
+
+    def __init__(self, delay=0.0):
+        self.delay = delay
+        self.handled = []
+        self.overlapped = False
+        self._running = set()
+        self._lock = threading.Lock()
+
+    def __call__(self, device):
+        with self._lock:
+            if device.sys_path in self._running:
+                self.overlapped = True
+            self._running.add(device.sys_path)
+        time.sleep(self.delay)
+        with self._lock:
+            self._running.discard(device.sys_path)
+            self.handled.append((device.sys_path, device.action))
+
+
+class CoalescingTest(unittest.TestCase):
+    def test_events_for_one_device_merge_on_submit(self):
+        pipeline = EventPipeline(lambda device: None)
+        pipeline.submit(FakeDevice('/a', 'add'))
+        pipeline.submit(FakeDevice('/a', 'change'))
+        pipeline.submit(FakeDevice('/b', 'add'))
+        pipeline.submit(FakeDevice('/a', 'change'))
+        self.assertEqual(queued(pipeline), [('/a', 'add'), ('/b', 'add')])
+        self.assertEqual(pipeline.coalesced, 2)
+
+    def test_remove_replaces_queued_add(self):
+        pipeline = EventPipeline(lambda device: None)
+        pipeline.submit(FakeDevice('/a', 'add'))
+        pipeline.submit(FakeDevice('/a', 'remove'))
+        self.assertEqual(queued(pipeline), [('/a', 'remove')])
+
+    def test_burst_is_handled_once_per_device(self):
+        handler = RecordingHandler()
+        pipeline = EventPipeline(handler, window=0.05)
+        pipeline.start()
+        for _ in range(5):
+            pipeline.submit(FakeDevice('/a', 'add'))
+            pipeline.submit(FakeDevice('/a', 'change'))
+        pipeline.stop()
+        self.assertEqual(handler.handled, [('/a', 'add')])
+        self.assertEqual(pipeline.submitted, 10)
+
+    def test_on_handled_reports_latency(self):
+        latencies = []
+        pipeline = EventPipeline(lambda device: None, window=0.02,
+                                 on_handled=lambda device, seconds: latencies.append(seconds))
+        pipeline.start()
+        pipeline.submit(FakeDevice('/a', 'add'))
+        pipeline.stop()
+        self.assertEqual(len(latencies), 1)
+        self.assertGreaterEqual(latencies[0], 0.02)
+
+
+class OrderingTest(unittest.TestCase):
+    def test_events_for_one_device_run_in_order_and_never_overlap(self):
+        handler = RecordingHandler(delay=0.05)
+        pipeline = EventPipeline(handler, window=0.01)
+        pipeline.start()
+        pipeline.submit(FakeDevice('/a', 'add'))
+        time.sleep(0.03)
+        # Arrives while the add is being handled
+        pipeline.submit(FakeDevice('/a', 'remove'))
+        pipeline.submit(FakeDevice('/b', 'add'))
+        pipeline.stop()
+        self.assertFalse(handler.overlapped)
+        a_events = [action for path, action in handler.handled if path == '/a']
+        self.assertEqual(a_events, ['add', 'remove'])
+        self.assertIn(('/b', 'add'), handler.handled)
+
+    def test_follow_up_keeps_latest_state(self):
+        handler = RecordingHandler(delay=0.05)
+        pipeline = EventPipeline(handler, window=0.01)
+        pipeline.start()
+        pipeline.submit(FakeDevice('/a', 'add'))
+        time.sleep(0.03)
+        pipeline.submit(FakeDevice('/a', 'remove'))
+        time.sleep(0.02)
+        pipeline.submit(FakeDevice('/a', 'add'))
+        pipeline.stop()
+        self.assertFalse(handler.overlapped)
+        self.assertEqual(handler.handled[0], ('/a', 'add'))
+        self.assertEqual(handler.handled[-1], ('/a', 'add'))
+
+
+class DropPolicyTest(unittest.TestCase):
+    def test_drop_oldest_discards_oldest_add(self):
+        pipeline = EventPipeline(lambda device: None, maxsize=2, drop_policy=DROP_OLDEST)
+        for path in ('/a', '/b', '/c'):
+            self.assertTrue(pipeline.submit(FakeDevice(path, 'add')))
+        self.assertEqual(queued(pipeline), [('/b', 'add'), ('/c', 'add')])
+        self.assertEqual(pipeline.dropped, 1)
+
+    def test_drop_newest_discards_incoming_add(self):
+        pipeline = EventPipeline(lambda device: None, maxsize=2, drop_policy=DROP_NEWEST)
+        pipeline.submit(FakeDevice('/a', 'add'))
+        pipeline.submit(FakeDevice('/b', 'add'))
+        self.assertFalse(pipeline.submit(FakeDevice('/c', 'add')))
+        self.assertEqual(queued(pipeline), [('/a', 'add'), ('/b', 'add')])
+
+    def test_remove_is_never_dropped(self):
+        for policy in (DROP_OLDEST, DROP_NEWEST):
+            with self.subTest(policy=policy):
+                pipeline = EventPipeline(lambda device: None, maxsize=2, drop_policy=policy)
+                pipeline.submit(FakeDevice('/a', 'remove'))
+                pipeline.submit(FakeDevice('/b', 'add'))
+                self.assertTrue(pipeline.submit(FakeDevice('/c', 'remove')))
+                self.assertEqual(queued(pipeline), [('/a', 'remove'), ('/c', 'remove')])
+
+    def test_add_is_dropped_rather_than_a_queued_remove(self):
+        pipeline = EventPipeline(lambda device: None, maxsize=2, drop_policy=DROP_OLDEST)
+        pipeline.submit(FakeDevice('/a', 'remove'))
+        pipeline.submit(FakeDevice('/b', 'remove'))
+        self.assertFalse(pipeline.submit(FakeDevice('/c', 'add')))
+        self.assertTrue(pipeline.submit(FakeDevice('/d', 'remove')))
+        self.assertEqual(queued(pipeline), [('/a', 'remove'), ('/b', 'remove'), ('/d', 'remove')])
+
+    def test_queue_is_bounded_by_devices_not_events(self):
+        pipeline = EventPipeline(lambda device: None, maxsize=2)
+        for _ in range(100):
+            pipeline.submit(FakeDevice('/a', 'change'))
+        self.assertEqual(pipeline.depth, 1)
+        self.assertEqual(pipeline.dropped, 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from key_token import TokenVerifier, TOKEN_FILE, read_token, token_binding
+
+DEVICE_ID = '/devices/pci0000:00/usb1/1-1/1-1:1.0/host0/target0:0:0/0:0:0:0/block/sda/sda1'
+PROPERTIES = {'ID_SERIAL': 'Vendor_Key_0123456789-0:0', 'ID_FS_UUID': '1A2B-3C4D'}
+
+
+class TokenBindingTest(unittest.TestCase):
+    def test_binding_covers_device_serial_and_uuid(self):
+        binding = token_binding(DEVICE_ID, PROPERTIES)
+        for value in (DEVICE_ID, PROPERTIES['ID_SERIAL'], PROPERTIES['ID_FS_UUID']):
+            self.assertIn(value, binding)
+
+    def test_no_binding_without_serial_or_uuid(self):
+        self.assertIsNone(token_binding(DEVICE_ID, {'ID_FS_UUID': '1A2B-3C4D'}))
+        self.assertIsNone(token_binding(DEVICE_ID, {'ID_SERIAL': 'Vendor_Key'}))
+
+
+class CheckTest(unittest.TestCase):
+    def setUp(self):
+        self.verifier = TokenVerifier(b'\x01' * 32)
+        self.binding = token_binding(DEVICE_ID, PROPERTIES)
+        self.token = self.verifier.issue(self.binding).encode('ascii')
+
+    def test_issued_token_is_valid(self):
+        self.assertTrue(self.verifier.check(self.binding, self.token))
+
+    def test_other_secret_is_invalid(self):
+        self.assertFalse(TokenVerifier(b'\x02' * 32).check(self.binding, self.token))
+
+    def test_binding_mismatch_is_invalid(self):
+        for key, value in (('ID_SERIAL', 'Vendor_Other_9876543210-0:0'), ('ID_FS_UUID', '5E6F-7A8B')):
+            with self.subTest(key=key):
+                binding = token_binding(DEVICE_ID, dict(PROPERTIES, **{key: value}))
+                self.assertFalse(self.verifier.check(binding, self.token))
+        other_port = token_binding(DEVICE_ID.replace('1-1', '1-2'), PROPERTIES)
+        self.assertFalse(self.verifier.check(other_port, self.token))
+
+    def test_missing_binding_is_invalid(self):
+        self.assertFalse(self.verifier.check(None, self.token))
+
+    def test_malformed_tokens_are_invalid(self):
+        digest = self.token[3:]
+        for token in (None, b'', self.token.decode('ascii'), self.token + b'0', self.token[:-1],
+                      b'v2.' + digest, self.token.upper(), b'v1.' + b'g' * 64, b'v1.\xff' + digest[1:]):
+            with self.subTest(token=token):
+                self.assertFalse(self.verifier.check(self.binding, token))
+
+    def test_non_ascii_tokens_are_invalid(self):
+        for token in ('v1.é'.encode('utf-8') + b'0' * 62, b'\xff' * 67, 'é'.encode('latin-1')):
+            with self.subTest(token=token):
+                self.assertFalse(self.verifier.check(self.binding, token))
+
+    def test_non_ascii_binding_can_be_issued(self):
+        binding = token_binding(DEVICE_ID, dict(PROPERTIES, ID_SERIAL='Vendor_Kéy\udcff'))
+        self.assertTrue(self.verifier.check(binding, self.verifier.issue(binding).encode('ascii')))
+
+
+class SessionTest(unittest.TestCase):
+    def setUp(self):
+        self.verifier = TokenVerifier(b'\x01' * 32)
+        self.binding = token_binding(DEVICE_ID, PROPERTIES)
+        self.token = self.verifier.issue(self.binding).encode('ascii')
+
+    def test_repeat_lookup_is_memoized(self):
+        self.assertTrue(self.verifier.verify(DEVICE_ID, self.binding, self.token))
+        self.assertTrue(self.verifier.verify(DEVICE_ID, self.binding, self.token))
+        self.assertEqual(self.verifier.stats(), {'verifications': 1, 'memo_hits': 1, 'sessions': 1})
+
+    def test_invalid_result_is_memoized(self):
+        self.assertFalse(self.verifier.verify(DEVICE_ID, self.binding, b'v1.' + b'0' * 64))
+        self.assertFalse(self.verifier.verify(DEVICE_ID, self.binding, b'v1.' + b'0' * 64))
+        self.assertEqual(self.verifier.verifications, 1)
+
+    def test_changed_binding_or_token_is_checked_again(self):
+        self.verifier.verify(DEVICE_ID, self.binding, self.token)
+        other = token_binding(DEVICE_ID, dict(PROPERTIES, ID_FS_UUID='5E6F-7A8B'))
+        self.assertFalse(self.verifier.verify(DEVICE_ID, other, self.token))
+        self.assertFalse(self.verifier.verify(DEVICE_ID, self.binding, b'v1.' + b'0' * 64))
+        self.assertEqual(self.verifier.verifications, 3)
+        self.assertEqual(self.verifier.memo_hits, 0)
+
+    def test_end_session_forgets_the_result(self):
+        self.verifier.verify(DEVICE_ID, self.binding, self.token)
+        self.verifier.end_session(DEVICE_ID)
+        self.assertEqual(self.verifier.stats()['sessions'], 0)
+        self.assertTrue(self.verifier.verify(DEVICE_ID, self.binding, self.token))
+        self.assertEqual(self.verifier.verifications, 2)
+
+    def test_end_unknown_session(self):
+        self.verifier.end_session('/devices/unknown')
+        self.assertEqual(self.verifier.stats()['sessions'], 0)
+
+
+class ReadTokenTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.mountpoint = self.directory.name
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def write(self, data):
+        with open(os.path.join(self.mountpoint, TOKEN_FILE), 'wb') as f:
+            f.write(data)
+
+    def test_missing_token(self):
+        self.assertIsNone(read_token(self.mountpoint))
+
+    def test_token_is_stripped(self):
+        self.write(b'v1.' + b'0' * 64 + b'\n')
+        self.assertEqual(read_token(self.mountpoint), b'v1.' + b'0' * 64)
+
+    def test_oversized_token_is_read_partially_and_rejected(self):
+        verifier = TokenVerifier(b'\x01' * 32)
+        binding = token_binding(DEVICE_ID, PROPERTIES)
+        self.write(verifier.issue(binding).encode('ascii') * 1000)
+        token = read_token(self.mountpoint)
+        self.assertLessEqual(len(token), 128)
+        self.assertFalse(verifier.check(binding, token))
+
+
+if __name__ == '__main__':
+    unittest.main()
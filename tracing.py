@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+import os
+import json
+import atexit
+import time
+import logging
+import functools
+import threading
+from collections import deque
+from fileutil import atomic_write
+
+DEFAULT_CAPACITY = 10000
+
+
+def chrome_event(pid, span):
+    """Convert a recorded span to a Chrome trace complete ('X') event"""
+    name, tid, start_ns, duration_ns, args = span
+    event = {
+        'name': name,
+        'ph': 'X',
+        'ts': start_ns / 1000,
+        'dur': duration_ns / 1000,
+        'pid': pid,
+        'tid': tid,
+    }
+    if args:
+        event['args'] = args
+    return event
+
+
+class ChromeTraceFile:
+    """Streams spans to a file in the Chrome trace JSON array format.
+
+    The closing bracket is optional in that format, so a file cut short by a
+    crash still loads in chrome://tracing or Perfetto.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, 'w', buffering=64 * 1024)
+        self._file.write('[\n')
+        self._lock = threading.Lock()
+        self._pid = os.getpid()
+        self._first = True
+
+    def __call__(self, span):
+        line = json.dumps(chrome_event(self._pid, span))
+        with self._lock:
+            if self._file.closed:
+                return
+            self._file.write(line if self._first else ',\n' + line)
+            self._first = False
+
+    def close(self):
+        with self._lock:
+            if not self._file.closed:
+                self._file.write('\n]\n')
+                self._file.close()
+
+
+class Tracer:
+    """Records timed spans of named methods into a ring buffer.
+
+    Nothing is instrumented until instrument() replaces methods on an object
+    with timing wrappers, so an untraced process runs the original methods.
+    Each span holds monotonic nanosecond timings; the newest `capacity` are
+    kept for dump(), and every span is also passed to any added sinks.
+    """
+
+    def __init__(self, capacity=DEFAULT_CAPACITY):
+        self.spans = deque(maxlen=capacity)
+        self.sinks = []
+
+    def add_sink(self, sink):
+        """Call sink(span) for every span recorded from now on"""
+        self.sinks.append(sink)
+
+    def record(self, name, start_ns, end_ns, args=None):
+        span = (name, threading.get_native_id(), start_ns, end_ns - start_ns, args)
+        # deque.append is atomic, so recording threads need no lock
+        self.spans.append(span)
+        for sink in self.sinks:
+            try:
+                sink(span)
+            except Exception as e:
+                logging.error("Error writing trace span: %s", e)
+
+    def wrap(self, name, func, describe=None):
+        """Get a version of func that records a span for each call"""
+        clock = time.monotonic_ns
+        record = self.record
+
+        @functools.wraps(func)
+        def traced(*args, **kwargs):
+            start = clock()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                record(name, start, clock(), describe(*args, **kwargs) if describe else None)
+        return traced
+
+    def instrument(self, obj, names, describe=None):
+        """Trace the named methods of obj.
+
+        describe, if given, is called with a method's arguments and returns
+        a dict stored with its span (such as the device it was called for).
+        """
+        prefix = type(obj).__name__
+        for name in names:
+            setattr(obj, name, self.wrap(f"{prefix}.{name}", getattr(obj, name), describe))
+
+    def chrome_trace(self):
+        """Get the buffered spans as a Chrome trace document"""
+        pid = os.getpid()
+        return {
+            'traceEvents': [chrome_event(pid, span) for span in list(self.spans)],
+            'displayTimeUnit': 'ns',
+        }
+
+    def dump(self, path):
+        """Write the buffered spans to a Chrome trace file"""
+        trace = self.chrome_trace()
+        atomic_write(path, json.dumps(trace))
+        logging.info("Wrote %s trace spans to %s", len(trace['traceEvents']), path)
+        return len(trace['traceEvents'])
+
+
+def describe_device(*args, **kwargs):
+    """Name the device a traced call was made for, if any"""
+    device_path = getattr(args[0], 'device_path', None) if args else None
+    return {'device': device_path} if device_path else None
+
+
+def start_tracing(trace_file=None):
+    """Set up the shared tracer, streaming to trace_file if given"""
+    if trace_file:
+        sink = ChromeTraceFile(trace_file)
+        tracer.add_sink(sink)
+        atexit.register(sink.close)
+    return tracer
+
+
+# Shared by the modules in this process
+tracer = Tracer()
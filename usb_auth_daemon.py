@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+"""Headless entry point for the USB authentication service.
+
+Imports only the hotplug path (no Tk, PIL or cryptography) and speaks the
+systemd notify protocol: READY=1 once keys already present are reconciled,
+WATCHDOG=1 at half the configured watchdog interval, STOPPING=1 on exit.
+With --trace, SIGUSR1 writes the most recent hot-path spans to
+usb_auth_trace.json in the data directory.
+"""
+import time
+
+START_TIME = time.monotonic()
+
+import os
+import sys
+import signal
+import socket
+import asyncio
+import logging
+import argparse
+import resource
+
+
+def sd_notify(message):
+    """Send a state update to systemd, doing nothing outside a notify service"""
+    address = os.environ.get('NOTIFY_SOCKET')
+    if not address:
+        return False
+    if address.startswith('@'):
+        # Abstract namespace socket
+        address = '\0' + address[1:]
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM | socket.SOCK_CLOEXEC) as sock:
+            sock.connect(address)
+            sock.sendall(message.encode())
+        return True
+    except OSError as e:
+        logging.error("Error notifying systemd: %s", e)
+        return False
+
+
+def watchdog_interval():
+    """Get the watchdog ping interval in seconds, or None if not enabled for us"""
+    usec = os.environ.get('WATCHDOG_USEC')
+    pid = os.environ.get('WATCHDOG_PID')
+    if not usec or (pid and int(pid) != os.getpid()):
+        return None
+    return int(usec) / 1e6 / 2
+
+
+def resident_memory():
+    """Get current and peak resident memory in KiB"""
+    current = None
+    try:
+        with open('/proc/self/status', 'r') as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    current = int(line.split()[1])
+                    break
+    except OSError:
+        pass
+    return current, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+async def watchdog(interval):
+    """Ping the systemd watchdog while the event loop is responsive"""
+    while True:
+        sd_notify("WATCHDOG=1")
+        await asyncio.sleep(interval)
+
+
+TRACE_DUMP_FILE = 'usb_auth_trace.json'
+
+
+async def serve(require_token=False, metrics_address=None, trace=False, trace_file=None):
+    """Run the service until cancelled by SIGTERM or SIGINT"""
+    # Imported after --data-dir is applied; the service opens its log file on import
+    from usb_auth_service import USBAuthService
+
+    service = USBAuthService(require_token=require_token)
+    if metrics_address:
+        from metrics import start_metrics_server
+        start_metrics_server(metrics_address)
+    loop = asyncio.get_running_loop()
+    task = asyncio.current_task()
+    for signum in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(signum, task.cancel)
+    if trace or trace_file:
+        from tracing import start_tracing
+        tracer = start_tracing(trace_file)
+        service.enable_tracing(tracer)
+        loop.add_signal_handler(signal.SIGUSR1, tracer.dump, TRACE_DUMP_FILE)
+
+    def ready():
+        startup_ms = (time.monotonic() - START_TIME) * 1000
+        current, peak = resident_memory()
+        logging.info("Daemon ready in %.0f ms, RSS %s KiB (peak %s KiB)", startup_ms, current, peak)
+        if 'tkinter' in sys.modules:
+            logging.warning("tkinter was imported by the headless daemon")
+        sd_notify(f"READY=1\nSTATUS=Watching USB devices, {len(service.authorized_ids)} authorized")
+
+    interval = watchdog_interval()
+    pinger = loop.create_task(watchdog(interval)) if interval else None
+    try:
+        await service.run_async(on_ready=ready)
+    except asyncio.CancelledError:
+        logging.info("Service stopped")
+    finally:
+        sd_notify("STOPPING=1")
+        if pinger is not None:
+            pinger.cancel()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Headless USB authentication daemon")
+    parser.add_argument('--data-dir', help="directory holding authorized_devices.db, auth_secret.key and usb_auth.log")
+    parser.add_argument('--require-token', action='store_true',
+                        help="only accept registered keys that carry a token issued by setup_usb.py")
+    parser.add_argument('--metrics', metavar='ADDRESS',
+                        help="serve Prometheus metrics at HOST:PORT or a Unix socket path")
+    parser.add_argument('--trace', action='store_true',
+                        help=f"record hot-path spans; SIGUSR1 writes them to {TRACE_DUMP_FILE}")
+    parser.add_argument('--trace-file', metavar='PATH',
+                        help="also stream every span to PATH in Chrome trace format (implies --trace)")
+    args = parser.parse_args()
+    if args.data_dir:
+        os.chdir(args.data_dir)
+    asyncio.run(serve(args.require_token, args.metrics, args.trace, args.trace_file))
+
+
+if __name__ == '__main__':
+    main()
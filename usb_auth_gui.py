@@ -1,15 +1,12 @@
 #!/usr/bin/env python3
 import os
-import sys
-import time
-import logging
 import threading
-from datetime import datetime
-import pyudev
-from cryptography.fernet import Fernet
-from dotenv import load_dotenv
 import customtkinter as ctk
-from PIL import Image, ImageTk
+from tkinter import messagebox
+from usb_auth_service import USBAuthService
+from gui_dispatch import TkDispatcher, report_first_window
+from virtual_list import VirtualList
+from background_scan import BackgroundScanner
 
 class USBAuthGUI:
     def __init__(self):
@@ -24,15 +21,26 @@ class USBAuthGUI:
         
         # Initialize authentication service
         self.auth_service = USBAuthService()
+        self.dispatcher = TkDispatcher(self.root)
+        self.device_scanner = BackgroundScanner(
+            lambda: [device_id for device_id, _ in self.auth_service.list_usb_devices()],
+            self.dispatcher
+        )
         self.setup_gui()
         
+        # Status changes are pushed from the service thread to the Tk loop
+        self.auth_service.add_state_listener(
+            lambda authenticated: self.dispatcher.call(self.update_status, authenticated)
+        )
+        self.auth_service.add_device_listener(
+            lambda added, removed: self.dispatcher.call(self.device_list.apply_diff, added, removed)
+        )
+        self.update_status()
+        
         # Start USB monitoring in a separate thread
         self.monitor_thread = threading.Thread(target=self.auth_service.run, daemon=True)
         self.monitor_thread.start()
         
-        # Start status update loop
-        self.update_status()
-        
     def setup_gui(self):
         # Title
         title_label = ctk.CTkLabel(
@@ -64,13 +72,26 @@ class USBAuthGUI:
         )
         device_label.pack(pady=10)
         
+        # Search Box
+        self.search_entry = ctk.CTkEntry(
+            device_frame,
+            width=300,
+            placeholder_text="Search devices..."
+        )
+        self.search_entry.pack(padx=10)
+        self.search_entry.bind(
+            "<KeyRelease>",
+            lambda event: self.device_list.set_filter(self.search_entry.get())
+        )
+        
         # Device List
-        self.device_listbox = ctk.CTkTextbox(
+        self.device_list = VirtualList(
             device_frame,
             width=300,
-            height=200
+            height=160,
+            empty_text="No registered devices"
         )
-        self.device_listbox.pack(pady=10, padx=10)
+        self.device_list.pack(pady=10, padx=10)
         
         # Buttons Frame
         button_frame = ctk.CTkFrame(self.root)
@@ -103,9 +124,11 @@ class USBAuthGUI:
         # Initial device list update
         self.refresh_device_list()
         
-    def update_status(self):
+    def update_status(self, authenticated=None):
         """Update the status label based on authentication state"""
-        if self.auth_service.is_authenticated:
+        if authenticated is None:
+            authenticated = self.auth_service.is_authenticated
+        if authenticated:
             self.status_label.configure(
                 text="Status: Authenticated ✓",
                 text_color="green"
@@ -115,16 +138,11 @@ class USBAuthGUI:
                 text="Status: Not Authenticated ✗",
                 text_color="red"
             )
-        self.root.after(1000, self.update_status)
         
     def refresh_device_list(self):
         """Update the device list display"""
-        self.device_listbox.delete("1.0", "end")
-        if self.auth_service.authorized_devices:
-            for device_id in self.auth_service.authorized_devices:
-                self.device_listbox.insert("end", f"{device_id}\n")
-        else:
-            self.device_listbox.insert("end", "No registered devices")
+        self.auth_service.reload_authorized_devices()
+        self.device_list.set_items(self.auth_service.authorized_snapshot())
             
     def show_register_dialog(self):
         """Show dialog for registering new devices"""
@@ -132,58 +150,65 @@ class USBAuthGUI:
         dialog.title("Register New Device")
         dialog.geometry("300x200")
         
-        # List connected devices
-        devices = self.auth_service.list_usb_devices()
-        if devices:
-            device_var = ctk.StringVar(value=devices[0][0])
-            
-            label = ctk.CTkLabel(
-                dialog,
-                text="Select a device to register:",
-                font=("Helvetica", 12)
-            )
-            label.pack(pady=10)
-            
-            device_menu = ctk.CTkOptionMenu(
-                dialog,
-                values=[d[0] for d in devices],
-                variable=device_var
-            )
-            device_menu.pack(pady=10)
-            
-            def register():
-                device_id = device_var.get()
-                if self.auth_service.register_device(device_id):
-                    self.refresh_device_list()
-                    dialog.destroy()
-                else:
-                    messagebox.showerror("Error", "Device already registered")
-            
-            register_button = ctk.CTkButton(
-                dialog,
-                text="Register",
-                command=register
-            )
-            register_button.pack(pady=10)
-        else:
-            label = ctk.CTkLabel(
-                dialog,
-                text="No USB devices found",
-                font=("Helvetica", 12)
-            )
-            label.pack(pady=10)
+        label = ctk.CTkLabel(
+            dialog,
+            text="Scanning for USB devices...",
+            font=("Helvetica", 12)
+        )
+        label.pack(pady=10)
+        
+        device_var = ctk.StringVar()
+        device_menu = ctk.CTkOptionMenu(
+            dialog,
+            values=[""],
+            variable=device_var,
+            state="disabled"
+        )
+        device_menu.pack(pady=10)
+        
+        def register():
+            device_id = device_var.get()
+            if self.auth_service.register_device(device_id):
+                dialog.destroy()
+            else:
+                messagebox.showerror("Error", "Device already registered")
+        
+        register_button = ctk.CTkButton(
+            dialog,
+            text="Register",
+            command=register,
+            state="disabled"
+        )
+        register_button.pack(pady=10)
+        
+        def show_devices(device_ids, error):
+            # Connected devices arrive from the background scan
+            if error is not None:
+                label.configure(text=f"Scan failed: {error}")
+            elif device_ids:
+                label.configure(text="Select a device to register:")
+                device_menu.configure(values=device_ids, state="normal")
+                device_var.set(device_ids[0])
+                register_button.configure(state="normal")
+            else:
+                label.configure(text="No USB devices found")
+        
+        ticket = self.device_scanner.request(show_devices)
+        dialog.bind(
+            "<Destroy>",
+            lambda event: event.widget is dialog and self.device_scanner.cancel(ticket),
+            add="+"
+        )
             
     def show_remove_dialog(self):
         """Show dialog for removing devices"""
-        if not self.auth_service.authorized_devices:
+        if not self.auth_service.authorized_ids:
             messagebox.showinfo("Info", "No registered devices to remove")
             return
             
         dialog = ctk.CTkToplevel(self.root)
         dialog.title("Remove Device")
-        dialog.geometry("300x200")
-        
-        device_var = ctk.StringVar(value=list(self.auth_service.authorized_devices)[0])
+        dialog.geometry("300x360")
         
         label = ctk.CTkLabel(
             dialog,
@@ -192,17 +217,31 @@ class USBAuthGUI:
         )
         label.pack(pady=10)
         
-        device_menu = ctk.CTkOptionMenu(
+        search_entry = ctk.CTkEntry(
             dialog,
-            values=list(self.auth_service.authorized_devices),
-            variable=device_var
+            width=260,
+            placeholder_text="Search devices..."
+        )
+        search_entry.pack(padx=10)
+        
+        device_list = VirtualList(
+            dialog,
+            width=260,
+            height=180,
+            empty_text="No matching devices"
+        )
+        device_list.pack(pady=10, padx=10)
+        device_list.set_items(self.auth_service.authorized_snapshot())
+        search_entry.bind(
+            "<KeyRelease>",
+            lambda event: device_list.set_filter(search_entry.get())
         )
-        device_menu.pack(pady=10)
         
         def remove():
-            device_id = device_var.get()
-            if self.auth_service.remove_device(device_id):
-                self.refresh_device_list()
+            device_id = device_list.selected
+            if device_id is None:
+                messagebox.showerror("Error", "Select a device to remove")
+            elif self.auth_service.remove_device(device_id):
                 dialog.destroy()
             else:
                 messagebox.showerror("Error", "Failed to remove device")
@@ -216,7 +255,11 @@ class USBAuthGUI:
         
     def run(self):
         """Start the GUI application"""
+        if os.environ.get('USB_AUTH_STARTUP_PROBE'):
+            report_first_window(self.root)
         self.root.mainloop()
+        self.auth_service.stop()
+        self.monitor_thread.join()
 
 if __name__ == "__main__":
     app = USBAuthGUI()
@@ -2,107 +2,462 @@
 import os
 import sys
 import time
+import asyncio
 import logging
+import threading
 from datetime import datetime
 import pyudev
-from cryptography.fernet import Fernet
-from dotenv import load_dotenv
-
-# Configure logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler('usb_auth.log'),
-        logging.StreamHandler()
-    ]
-)
+from device_identity import identity_cache, list_usb_partitions
+from device_store import AuthorizedDeviceStore
+from store_watcher import StoreWatcher
+from event_pipeline import EventPipeline
+from device_sessions import SessionTable
+from drive_discovery import DriveMonitor, read_mounts
+from key_token import TokenVerifier, load_secret, read_token, token_binding
+from metrics import registry
+from tracing import describe_device
+from log_setup import configure_logging
+
+# Configure logging (written by a background thread, rotated at 5 MB)
+configure_logging('usb_auth.log')
+
+DECISION_SECONDS = registry.histogram(
+    'usb_auth_decision_seconds', "Time from a device event being received to its access decision")
+STORE_LOOKUP_SECONDS = registry.histogram(
+    'usb_auth_store_lookup_seconds', "Time to look up a device ID among the authorized devices",
+    buckets=(1e-7, 2.5e-7, 5e-7, 1e-6, 2.5e-6, 5e-6, 1e-5, 1e-4, 1e-3))
+GRANTS = registry.counter('usb_auth_grants_total', "Times access was granted")
+DENIES = registry.counter('usb_auth_denies_total', "Times access was denied")
+REVOCATIONS = registry.counter('usb_auth_revocations_total', "Times access was revoked because the last authorized key went away")
+
+# Hot-path stages timed by enable_tracing()
+TRACED_METHODS = ('get_device_id', 'authenticate_device', 'handle_device_event', 'grant_access', 'deny_access')
 
 class USBAuthService:
-    def __init__(self):
+    def __init__(self, require_token=False):
         self.authorized_devices = set()
-        self.is_authenticated = False
+        # Updated in place under reload_lock; a membership test is a single
+        # set operation, so lookups need no lock
+        self.authorized_ids = set()
+        self.store_seq = 0
+        self.reload_lock = threading.Lock()
+        self.sessions = SessionTable()
+        self.state_listeners = []
+        self.device_listeners = []
         self.context = pyudev.Context()
         self.monitor = pyudev.Monitor.from_netlink(self.context)
         self.monitor.filter_by(subsystem='block', device_type='partition')
+        # Keeps the observer thread free while access actions run on workers
+        self.pipeline = EventPipeline(
+            self.handle_device_event, on_handled=lambda device, seconds: DECISION_SECONDS.observe(seconds))
+        # With tokens required, a registered key must also carry a valid token,
+        # which can only be read once the key's filesystem is mounted
+        self.token_verifier = TokenVerifier(load_secret()) if require_token else None
+        self.awaiting_mount = {}
+        self.awaiting_lock = threading.Lock()
+        self.drive_monitor = None
+        # One reader on the monitor feeds a queue per events() consumer
+        self.event_queues = set()
+        self.stopped = threading.Event()
         self.load_authorized_devices()
+        self.register_metrics()
+
+    def register_metrics(self):
+        """Export counters this service already keeps, read only when scraped"""
+        pipeline = self.pipeline
+        registry.collect('usb_auth_events_total', "Device events received", lambda: pipeline.submitted, 'counter')
+        registry.collect('usb_auth_events_dropped_total', "Device events dropped because the queue was full",
+                         lambda: pipeline.dropped, 'counter')
+        registry.collect('usb_auth_events_coalesced_total', "Device events merged into a later event for the same device",
+                         lambda: pipeline.coalesced, 'counter')
+        registry.collect('usb_auth_event_queue_depth', "Device events waiting to be handled", lambda: pipeline.depth)
+        registry.collect('usb_auth_identity_cache_hits_total', "Device identities served from the cache",
+                         lambda: identity_cache.hits, 'counter')
+        registry.collect('usb_auth_identity_cache_misses_total', "Device identities resolved from sysfs",
+                         lambda: identity_cache.misses, 'counter')
+        registry.collect('usb_auth_sessions', "Authorized keys currently present", lambda: len(self.sessions))
+        registry.collect('usb_auth_authorized_devices', "Registered device IDs", lambda: len(self.authorized_ids))
+        if self.token_verifier is not None:
+            verifier = self.token_verifier
+            registry.collect('usb_auth_token_verifications_total', "Key tokens checked cryptographically",
+                             lambda: verifier.verifications, 'counter')
         
     def load_authorized_devices(self):
-        """Load authorized device IDs from storage"""
+        """Open the authorized device store"""
         try:
-            if os.path.exists('authorized_devices.txt'):
-                with open('authorized_devices.txt', 'r') as f:
-                    self.authorized_devices = set(line.strip() for line in f)
-                logging.info(f"Loaded {len(self.authorized_devices)} authorized devices")
+            self.authorized_devices = AuthorizedDeviceStore()
+            device_ids, self.store_seq = self.authorized_devices.snapshot()
+            self.authorized_ids = set(device_ids)
+            logging.info("Loaded %s authorized devices", len(self.authorized_ids))
         except Exception as e:
-            logging.error(f"Error loading authorized devices: {e}")
+            logging.error("Error loading authorized devices: %s", e)
+
+    def enable_tracing(self, tracer):
+        """Record a span for each hot-path stage from now on"""
+        tracer.instrument(self, TRACED_METHODS, describe_device)
+        # The pipeline holds the handler it was created with
+        self.pipeline.handler = self.handle_device_event
+
+    def reload_authorized_devices(self):
+        """Apply devices registered or removed since the last load"""
+        with self.reload_lock:
+            added, removed, seq = self.authorized_devices.changes_for(self.authorized_ids, self.store_seq)
+            if seq == self.store_seq:
+                return
+            # Applied in place so a registration costs O(changes), not O(devices)
+            self.authorized_ids.difference_update(removed)
+            self.authorized_ids.update(added)
+            self.store_seq = seq
+        logging.info("Authorized devices updated: %s added, %s removed", len(added), len(removed))
+        for callback in self.device_listeners:
+            try:
+                callback(added, removed)
+            except Exception as e:
+                logging.error("Error notifying device listener: %s", e)
+        for device_id in removed:
+            # A key removed from the store no longer holds access while inserted
+            ended, remaining = self.sessions.remove_identity(device_id)
+            if ended and remaining == 0:
+                logging.info("Access revoked - device %s was unregistered", device_id)
+                REVOCATIONS.inc()
+                self.deny_access()
+
+    def authorized_snapshot(self):
+        """Get a copy of the authorized device IDs that is safe to iterate"""
+        with self.reload_lock:
+            return frozenset(self.authorized_ids)
+
+    def add_device_listener(self, callback):
+        """Call callback(added, removed) whenever the authorized devices change"""
+        self.device_listeners.append(callback)
+
+    def list_usb_devices(self):
+        """List all connected USB devices"""
+        devices = []
+        for device in list_usb_partitions(self.context):
+            device_id = self.get_device_id(device)
+            if device_id:
+                devices.append((device_id, device))
+        return devices
+
+    def register_device(self, device_id):
+        """Register a new USB device"""
+        if self.authorized_devices.add(device_id):
+            logging.info("Device %s registered successfully", device_id)
+            self.reload_authorized_devices()
+            return True
+        return False
+
+    def remove_device(self, device_id):
+        """Remove a registered USB device"""
+        if self.authorized_devices.remove(device_id):
+            logging.info("Device %s removed successfully", device_id)
+            self.reload_authorized_devices()
+            return True
+        return False
 
     def get_device_id(self, device):
         """Get unique identifier for USB device"""
-        try:
-            # Get device serial number or UUID
-            serial = device.attributes.get('serial')
-            if serial:
-                return serial.decode('utf-8')
-            # Fallback to device path
-            return device.device_path
-        except Exception as e:
-            logging.error(f"Error getting device ID: {e}")
-            return None
+        return identity_cache.get_device_id(device)
+
+    @property
+    def is_authenticated(self):
+        """Whether at least one authorized key is present"""
+        return len(self.sessions) > 0
 
     def authenticate_device(self, device):
-        """Authenticate USB device"""
+        """Authenticate USB device.
+
+        Returns True or False, or None for a registered key whose token
+        cannot be checked until it is mounted.
+        """
         device_id = self.get_device_id(device)
-        if device_id and device_id in self.authorized_devices:
-            self.is_authenticated = True
-            logging.info(f"Device {device_id} authenticated successfully")
+        start = time.perf_counter()
+        authorized = device_id in self.authorized_ids
+        STORE_LOOKUP_SECONDS.observe(time.perf_counter() - start)
+        if device_id and authorized:
+            if self.token_verifier is not None:
+                verified = self.verify_token(device, device_id)
+                if not verified:
+                    return verified
+            logging.info("Device %s authenticated successfully", device_id)
             return True
-        logging.warning(f"Unauthorized device detected: {device_id}")
+        logging.warning("Unauthorized device detected: %s", device_id)
         return False
 
+    def device_mountpoint(self, device, mounts=None):
+        """Get where a partition is mounted, or None"""
+        if mounts is None:
+            mounts = read_mounts()
+        number = device.device_number
+        return mounts.get(f"{os.major(number)}:{os.minor(number)}")
+
+    def verify_token(self, device, device_id):
+        """Check the token on a registered key, or return None and wait for it to be mounted"""
+        mountpoint = self.device_mountpoint(device)
+        if mountpoint is None:
+            with self.awaiting_lock:
+                self.awaiting_mount[device.device_path] = device
+            logging.info("Device %s is registered, waiting for it to be mounted", device_id)
+            return None
+        binding = token_binding(device_id, device.properties)
+        if self.token_verifier.verify(device.device_path, binding, read_token(mountpoint)):
+            return True
+        logging.warning("Device %s is registered but its token is missing or invalid", device_id)
+        return False
+
+    def check_awaiting_mount(self):
+        """Verify registered keys that have been mounted since they were inserted"""
+        if not self.awaiting_mount:
+            return
+        mounts = read_mounts()
+        granted = False
+        # Held throughout so a concurrent removal cannot leave a stale session
+        with self.awaiting_lock:
+            mounted = []
+            device_ids = {}
+            for device_path, device in list(self.awaiting_mount.items()):
+                mountpoint = self.device_mountpoint(device, mounts)
+                if mountpoint is not None:
+                    device_id = device_ids[device_path] = self.get_device_id(device)
+                    binding = token_binding(device_id, device.properties)
+                    mounted.append((device_path, binding, read_token(mountpoint)))
+            results = {device_path: self.token_verifier.verify(device_path, binding, token)
+                       for device_path, binding, token in mounted}
+            for device_path, device_id in device_ids.items():
+                # Only forgotten once checked, so a failure cannot strand the rest of the batch
+                del self.awaiting_mount[device_path]
+                if not results[device_path]:
+                    logging.warning("Device %s is registered but its token is missing or invalid", device_id)
+                elif device_id in self.authorized_ids:
+                    logging.info("Device %s authenticated successfully", device_id)
+                    granted = self.sessions.add(device_path, device_id) or granted
+        if granted:
+            self.grant_access()
+
+    def start_token_checks(self):
+        """Watch for keys being mounted when tokens are required"""
+        if self.token_verifier is not None:
+            self.drive_monitor = DriveMonitor(self.check_awaiting_mount, self.context)
+            self.drive_monitor.start()
+
+    def stop_token_checks(self):
+        if self.drive_monitor is not None:
+            self.drive_monitor.stop()
+            self.drive_monitor = None
+
+    def reconcile_present_devices(self):
+        """Start sessions for authorized keys inserted before the service started.
+
+        Call after the monitor has started so that any event racing the scan
+        is buffered and handled afterwards rather than lost.
+        """
+        start = time.monotonic()
+        granted = False
+        if self.token_verifier is not None:
+            granted = self.reconcile_tokens()
+        else:
+            for device in list_usb_partitions(self.context):
+                if self.authenticate_device(device):
+                    granted = self.sessions.add(device.device_path, self.get_device_id(device)) or granted
+        if granted:
+            self.grant_access()
+        logging.info("Startup scan found %s authorized device(s) in %.1f ms", len(self.sessions), (time.monotonic() - start) * 1000)
+
+    def reconcile_tokens(self):
+        """Verify the tokens of every registered key present"""
+        mounts = read_mounts()
+        present = []
+        device_ids = {}
+        for device in list_usb_partitions(self.context):
+            device_id = self.get_device_id(device)
+            if device_id not in self.authorized_ids:
+                continue
+            mountpoint = self.device_mountpoint(device, mounts)
+            if mountpoint is None:
+                with self.awaiting_lock:
+                    self.awaiting_mount[device.device_path] = device
+                continue
+            device_ids[device.device_path] = device_id
+            binding = token_binding(device_id, device.properties)
+            present.append((device.device_path, binding, read_token(mountpoint)))
+        results = {device_path: self.token_verifier.verify(device_path, binding, token)
+                   for device_path, binding, token in present}
+        granted = False
+        for device_path, device_id in device_ids.items():
+            if results[device_path]:
+                granted = self.sessions.add(device_path, device_id) or granted
+            else:
+                logging.warning("Device %s is registered but its token is missing or invalid", device_id)
+        return granted
+
     def handle_device_event(self, device):
         """Handle USB device events"""
         action = device.action
         if action == 'add':
-            if self.authenticate_device(device):
-                self.grant_access()
-            else:
+            # Events for a device are handled one at a time, so nothing can re-cache a
+            # stick that was pulled while an earlier event for this path was running
+            identity_cache.evict(device)
+            authenticated = self.authenticate_device(device)
+            if authenticated:
+                if self.sessions.add(device.device_path, self.get_device_id(device)):
+                    self.grant_access()
+            elif device.device_path in self.sessions:
+                # A remove was merged into this add; the key that held the session is
+                # gone. Any token state for the path now belongs to the new key
+                self.end_session(device.device_path)
+            elif authenticated is None:
+                # Decided by check_awaiting_mount once the key is mounted
+                pass
+            elif not self.is_authenticated:
                 self.deny_access()
         elif action == 'remove':
-            self.revoke_access()
+            self.revoke_access(device)
+
+    def submit_event(self, device):
+        """Queue a device event for handling, evicting its cached identity first"""
+        # Done here rather than in the handler so a coalesced or dropped event still evicts
+        identity_cache.handle_event(device)
+        self.pipeline.submit(device)
+
+    def add_state_listener(self, callback):
+        """Call callback(is_authenticated) from the deciding thread on every access decision"""
+        self.state_listeners.append(callback)
+
+    def notify_state(self):
+        """Publish the current authentication state to listeners"""
+        authenticated = self.is_authenticated
+        for callback in self.state_listeners:
+            try:
+                callback(authenticated)
+            except Exception as e:
+                logging.error("Error notifying state listener: %s", e)
 
     def grant_access(self):
         """Grant system access"""
         logging.info("Access granted")
+        GRANTS.inc()
+        self.notify_state()
         # Implement your access granting logic here
         # For example, unlock the system, start specific services, etc.
 
     def deny_access(self):
         """Deny system access"""
         logging.info("Access denied")
+        DENIES.inc()
+        self.notify_state()
         # Implement your access denial logic here
         # For example, lock the system, show warning message, etc.
 
-    def revoke_access(self):
-        """Revoke system access when USB is removed"""
-        if self.is_authenticated:
-            self.is_authenticated = False
+    def revoke_access(self, device):
+        """Revoke system access when the last authorized USB is removed"""
+        if self.token_verifier is not None:
+            with self.awaiting_lock:
+                self.awaiting_mount.pop(device.device_path, None)
+                self.token_verifier.end_session(device.device_path)
+        self.end_session(device.device_path)
+
+    def end_session(self, device_path):
+        """End the session at a device path, denying access if it was the last"""
+        session = self.sessions.remove(device_path)
+        if session is None:
+            # Not an authorized key, so access is unaffected
+            return
+        device_id, remaining = session
+        if remaining == 0:
             logging.info("Access revoked - USB device removed")
+            REVOCATIONS.inc()
             self.deny_access()
+        else:
+            logging.info("Device %s removed, %s authorized device(s) still present", device_id, remaining)
 
     def run(self):
         """Main service loop"""
         logging.info("USB Authentication Service started")
-        observer = pyudev.MonitorObserver(self.monitor, self.handle_device_event)
+        watcher = StoreWatcher(self.authorized_devices.path, self.reload_authorized_devices)
+        watcher.start()
+        # Pick up anything registered between loading the store and starting the watch
+        self.reload_authorized_devices()
+        self.monitor.start()
+        self.start_token_checks()
+        self.reconcile_present_devices()
+        self.pipeline.start()
+        observer = pyudev.MonitorObserver(self.monitor, callback=self.submit_event)
         observer.start()
         try:
-            while True:
-                time.sleep(1)
+            self.stopped.wait()
         except KeyboardInterrupt:
-            observer.stop()
             logging.info("Service stopped by user")
+        observer.stop()
         observer.join()
+        self.pipeline.stop()
+        self.stop_token_checks()
+        watcher.stop()
+        logging.info("Event pipeline: %s, identity cache: %s", self.pipeline.stats(), identity_cache.stats())
+
+    def stop(self):
+        """Make run() return"""
+        self.stopped.set()
+
+    def dispatch_monitor_events(self):
+        """Hand each device event buffered on the monitor to every events() consumer"""
+        # Drain everything buffered on the netlink socket without blocking
+        while True:
+            device = self.monitor.poll(timeout=0)
+            if device is None:
+                break
+            for queue in self.event_queues:
+                queue.put_nowait(device)
+
+    async def events(self):
+        """Yield device events from the monitor as the event loop sees them.
+
+        Any number of consumers on the same event loop may iterate this at
+        once; each sees every event.
+        """
+        loop = asyncio.get_running_loop()
+        queue = asyncio.Queue()
+        fd = self.monitor.fileno()
+        if not self.event_queues:
+            self.monitor.start()
+            loop.add_reader(fd, self.dispatch_monitor_events)
+        self.event_queues.add(queue)
+        try:
+            while True:
+                yield await queue.get()
+        finally:
+            self.event_queues.discard(queue)
+            if not self.event_queues:
+                loop.remove_reader(fd)
+
+    async def run_async(self, on_ready=None):
+        """Main service loop on the running asyncio event loop.
+
+        on_ready is called once the startup scan is done and events are
+        being consumed.
+        """
+        logging.info("USB Authentication Service started")
+        watcher = StoreWatcher(self.authorized_devices.path, self.reload_authorized_devices)
+        watcher.start()
+        self.reload_authorized_devices()
+        self.monitor.start()
+        self.start_token_checks()
+        self.reconcile_present_devices()
+        self.pipeline.start()
+        if on_ready is not None:
+            on_ready()
+        try:
+            async for device in self.events():
+                self.submit_event(device)
+        finally:
+            self.pipeline.stop()
+            self.stop_token_checks()
+            watcher.stop()
+            logging.info("Event pipeline: %s, identity cache: %s", self.pipeline.stats(), identity_cache.stats())
 
 if __name__ == "__main__":
     service = USBAuthService()
-    service.run() 
\ No newline at end of file
+    try:
+        asyncio.run(service.run_async())
+    except KeyboardInterrupt:
+        logging.info("Service stopped by user") 
\ No newline at end of file
@@ -6,8 +6,19 @@ import platform
 import customtkinter as ctk
 from tkinter import messagebox
 import json
-from cryptography.fernet import Fernet
+import threading
 from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+from gui_dispatch import TkDispatcher, report_first_window
+from background_scan import BackgroundScanner
+from fileutil import copy_verified
+from drive_discovery import RemovableDrive, find_linux_drives, DriveMonitor
+
+# Upper bound on concurrent installs; beyond this the USB bus is the limit anyway
+MAX_PARALLEL_INSTALLS = 32
+
+# Files that make up the program installed on the drive
+PROGRAM_FILES = ("usb_program.py", "log_setup.py", "fileutil.py", "metrics.py", "tracing.py", "drive_discovery.py")
 
 # Platform-specific imports
 if platform.system() == 'Windows':
@@ -20,14 +31,20 @@ class USBInstaller:
     def __init__(self):
         self.root = ctk.CTk()
         self.root.title("USB Security Installer")
-        self.root.geometry("500x400")
+        self.root.geometry("500x560")
         self.root.resizable(False, False)
         
         # Set theme
         ctk.set_appearance_mode("dark")
         ctk.set_default_color_theme("blue")
         
+        self.drive_rows = {}
+        self.installing = False
+        self.dispatcher = TkDispatcher(self.root)
+        self.drive_scanner = BackgroundScanner(self.get_removable_drives, self.dispatcher)
         self.setup_gui()
+        self.refresh_drives()
+        self.start_drive_monitor()
         
     def setup_gui(self):
         # Title
@@ -44,18 +61,17 @@ class USBInstaller:
         
         drive_label = ctk.CTkLabel(
             drive_frame,
-            text="Select USB Drive:",
+            text="Select USB Drives:",
             font=("Helvetica", 12)
         )
         drive_label.pack(pady=5)
         
-        self.drive_var = ctk.StringVar()
-        self.drive_menu = ctk.CTkOptionMenu(
+        # One row per drive with its own checkbox and progress
+        self.drive_list = ctk.CTkScrollableFrame(
             drive_frame,
-            values=self.get_removable_drives(),
-            variable=self.drive_var
+            height=140
         )
-        self.drive_menu.pack(pady=5)
+        self.drive_list.pack(pady=5, padx=10, fill="x")
         
         # Refresh Button
         refresh_button = ctk.CTkButton(
@@ -97,12 +113,12 @@ class USBInstaller:
         self.progress_label.pack(pady=5)
         
         # Install Button
-        install_button = ctk.CTkButton(
+        self.install_button = ctk.CTkButton(
             self.root,
             text="Install",
             command=self.install
         )
-        install_button.pack(pady=20)
+        self.install_button.pack(pady=20)
         
     def get_removable_drives(self):
         """Get list of removable drives based on platform"""
@@ -114,72 +130,179 @@ class USBInstaller:
                 if bitmask & 1:
                     drive = f"{letter}:\\"
                     if win32file.GetDriveType(drive) == win32con.DRIVE_REMOVABLE:
-                        drives.append(drive)
+                        try:
+                            size = shutil.disk_usage(drive).total
+                        except OSError:
+                            # No media, such as an empty card reader slot
+                            size = None
+                        drives.append(RemovableDrive(drive, drive, size, None))
                 bitmask >>= 1
         elif platform.system() == 'Linux':
-            # Linux-specific drive detection
-            output = os.popen("df -h").read()
-            for line in output.split('\n'):
-                if '/dev/sd' in line and 'media' in line:
-                    drive = line.split()[0]
-                    drives.append(drive)
+            # Linux-specific drive detection from mountinfo, sysfs and udev
+            drives = find_linux_drives()
         elif platform.system() == 'Darwin':
             # macOS-specific drive detection
-            output = os.popen("df -h").read()
+            output = os.popen("df -k").read()
             for line in output.split('\n'):
                 if '/Volumes/' in line:
-                    drive = line.split()[0]
-                    drives.append(drive)
+                    fields = line.split()
+                    drives.append(RemovableDrive(fields[0], line[line.index('/Volumes/'):], int(fields[1]) * 1024, None))
         
-        return drives if drives else ["No USB drives found"]
+        return drives
+    
+    def start_drive_monitor(self):
+        """Refresh the drive list on hotplug and mount changes where supported"""
+        self.drive_monitor = None
+        if platform.system() != 'Linux':
+            return
+        try:
+            self.drive_monitor = DriveMonitor(lambda: self.dispatcher.call(self.refresh_drives))
+            self.drive_monitor.start()
+        except Exception:
+            # Without pyudev the Refresh button still works
+            self.drive_monitor = None
     
     def refresh_drives(self):
-        """Refresh the list of removable drives"""
-        drives = self.get_removable_drives()
-        self.drive_menu.configure(values=drives)
-        if drives[0] != "No USB drives found":
-            self.drive_var.set(drives[0])
+        """Refresh the list of removable drives in the background"""
+        if self.installing:
+            return
+        self.show_drive_message("Scanning...")
+        self.drive_scanner.request(self.show_drives, force=True)
+    
+    def show_drive_message(self, text):
+        """Replace the drive list with a message"""
+        for child in self.drive_list.winfo_children():
+            child.destroy()
+        self.drive_rows = {}
+        ctk.CTkLabel(self.drive_list, text=text).pack(pady=5)
+    
+    def show_drives(self, drives, error):
+        """Fill the drive list with the result of a background scan"""
+        if error is not None or not drives:
+            self.show_drive_message("No USB drives found")
+            return
+        for child in self.drive_list.winfo_children():
+            child.destroy()
+        self.drive_rows = {}
+        for drive in drives:
+            row = ctk.CTkFrame(self.drive_list)
+            row.pack(fill="x", pady=2)
+            # Nothing is preselected so a click cannot write to every attached disk
+            selected = ctk.BooleanVar(value=False)
+            size = f"{drive.size / 1e9:.1f} GB" if drive.size else "unknown size"
+            text = f"{drive.mountpoint or 'not mounted'} ({drive.device}, {size})"
+            ctk.CTkCheckBox(
+                row,
+                text=text,
+                variable=selected,
+                state="normal" if drive.mountpoint else "disabled"
+            ).pack(side="left", padx=5)
+            status = ctk.CTkLabel(row, text="", font=("Helvetica", 11))
+            status.pack(side="right", padx=5)
+            self.drive_rows[drive.device] = (drive, selected, status)
+    
+    def set_drive_status(self, drive, text):
+        """Show progress for one drive (Tk thread only)"""
+        row = self.drive_rows.get(drive.device)
+        if row is not None:
+            row[2].configure(text=text)
     
     def install(self):
-        """Install the security program to the selected USB drive"""
-        drive = self.drive_var.get()
-        if drive == "No USB drives found":
+        """Install the security program to every selected USB drive in parallel"""
+        drives = [drive for drive, selected, _ in self.drive_rows.values() if selected.get()]
+        if not drives:
             messagebox.showerror("Error", "No USB drive selected")
             return
-            
-        try:
-            # Create program directory
-            if platform.system() == 'Windows':
-                program_dir = os.path.join(drive, "USB_Security")
-            elif platform.system() == 'Linux':
-                program_dir = os.path.join(drive, "USB_Security")
-            elif platform.system() == 'Darwin':
-                program_dir = os.path.join(drive, "USB_Security")
-            
-            os.makedirs(program_dir, exist_ok=True)
-            
-            # Copy program files
-            self.copy_program_files(program_dir)
-            
-            # Create autorun configuration
-            self.create_autorun(program_dir)
-            
-            # Initialize security configuration
-            self.initialize_security(program_dir)
-            
-            messagebox.showinfo("Success", "Installation completed successfully!")
+        if self.installing:
+            return
+        
+        self.installing = True
+        self.install_button.configure(state="disabled")
+        self.progress_label.configure(text=f"Installing to {len(drives)} drive(s)...")
+        autostart = self.autostart_var.get()
+        results = {}
+        
+        def install_one(drive):
+            def report(text):
+                self.dispatcher.call(self.set_drive_status, drive, text)
+            try:
+                self.install_to_drive(drive, autostart, report)
+                report("Done")
+                results[drive] = None
+            except Exception as e:
+                # A failing drive must not affect the others
+                report("Failed")
+                results[drive] = e
+        
+        def run_batch():
+            with ThreadPoolExecutor(max_workers=min(len(drives), MAX_PARALLEL_INSTALLS)) as pool:
+                list(pool.map(install_one, drives))
+            # The host has one autorun entry, which can only point at one drive, so
+            # it is written only when starting automatically from a single drive
+            autorun_error = None
+            if autostart and len(drives) == 1 and results.get(drives[0]) is None:
+                try:
+                    self.create_host_autorun(self.program_dir(drives[0]))
+                except Exception as e:
+                    autorun_error = e
+            self.dispatcher.call(self.finish_install, results, autorun_error, autostart and len(drives) > 1)
+        
+        threading.Thread(target=run_batch, name='usb-install', daemon=True).start()
+    
+    def finish_install(self, results, autorun_error=None, autorun_skipped=False):
+        """Summarize a batch installation (Tk thread only)"""
+        self.installing = False
+        self.install_button.configure(state="normal")
+        failed = {drive: e for drive, e in results.items() if e is not None}
+        if autorun_error is not None:
+            messagebox.showwarning("Warning", f"Could not create the system autorun configuration: {autorun_error}")
+        elif autorun_skipped:
+            messagebox.showwarning(
+                "Warning",
+                "Automatic start was not set up on this computer because several drives were installed. "
+                "Install to a single drive to set it up."
+            )
+        if not failed:
+            messagebox.showinfo("Success", f"Installation completed successfully on {len(results)} drive(s)!")
             self.progress_label.configure(text="Installation completed")
-            
-        except Exception as e:
-            messagebox.showerror("Error", f"Installation failed: {str(e)}")
+        else:
+            details = "\n".join(f"{drive.mountpoint}: {e}" for drive, e in failed.items())
+            messagebox.showerror("Error", f"Installation failed on {len(failed)} of {len(results)} drive(s):\n{details}")
             self.progress_label.configure(text="Installation failed")
     
-    def copy_program_files(self, target_dir):
+    def install_to_drive(self, drive, autostart, report):
+        """Install the security program to one drive (safe off the Tk thread)"""
+        if drive.mountpoint is None:
+            raise OSError(f"{drive.device} is not mounted")
+        
+        # Create program directory
+        program_dir = self.program_dir(drive)
+        os.makedirs(program_dir, exist_ok=True)
+        
+        # Copy program files
+        self.copy_program_files(program_dir, report)
+        
+        # Create autorun configuration on the drive
+        self.create_autorun(program_dir, report)
+        
+        # Initialize security configuration
+        self.initialize_security(program_dir, autostart, report)
+        return program_dir
+    
+    def program_dir(self, drive):
+        """Get where the program is installed on a drive"""
+        return os.path.join(drive.mountpoint, "USB_Security")
+    
+    def copy_program_files(self, target_dir, report):
         """Copy program files to USB drive"""
-        self.progress_label.configure(text="Copying program files...")
+        report("Copying program files...")
         
-        # Copy main program
-        shutil.copy2("usb_program.py", os.path.join(target_dir, "usb_program.py"))
+        # Copy the program and its modules, flushed to the drive and read back before continuing
+        for name in PROGRAM_FILES:
+            def copy_progress(done, total, rate, name=name):
+                percent = done * 100 // total if total else 100
+                report(f"Copying {name}: {percent}% ({rate / 1e6:.1f} MB/s)")
+            copy_verified(name, os.path.join(target_dir, name), copy_progress)
         
         # Copy platform-specific files if needed
         if platform.system() == 'Windows':
@@ -192,11 +315,10 @@ class USBInstaller:
             # Copy macOS-specific files
             pass
     
-    def create_autorun(self, program_dir):
-        """Create autorun configuration based on platform"""
-        self.progress_label.configure(text="Creating autorun configuration...")
-        
+    def create_autorun(self, program_dir, report):
+        """Create the autorun configuration stored on the drive"""
         if platform.system() == 'Windows':
+            report("Creating autorun configuration...")
             # Windows autorun.inf
             autorun_path = os.path.join(program_dir, "autorun.inf")
             with open(autorun_path, "w") as f:
@@ -205,7 +327,10 @@ open=pythonw.exe "{os.path.join(program_dir, 'usb_program.py')}"
 icon={os.path.join(program_dir, 'icon.ico')}
 label=USB Security
 """)
-        elif platform.system() == 'Linux':
+    
+    def create_host_autorun(self, program_dir):
+        """Create the host's autorun configuration for a program directory"""
+        if platform.system() == 'Linux':
             # Linux udev rules
             udev_rules = f"""SUBSYSTEM=="block", ACTION=="add", ENV{{ID_BUS}}=="usb", RUN+="/usr/bin/python3 {os.path.join(program_dir, 'usb_program.py')}"
 """
@@ -233,9 +358,12 @@ label=USB Security
             with open("/Library/LaunchAgents/com.usb.security.plist", "w") as f:
                 f.write(launchd_plist)
     
-    def initialize_security(self, program_dir):
+    def initialize_security(self, program_dir, autostart, report):
         """Initialize security configuration"""
-        self.progress_label.configure(text="Initializing security...")
+        report("Initializing security...")
+        
+        # Imported here so the installer window does not wait on OpenSSL bindings
+        from cryptography.fernet import Fernet
         
         # Generate security key
         key = Fernet.generate_key()
@@ -246,7 +374,7 @@ label=USB Security
         config = {
             "installed": True,
             "install_date": str(datetime.now()),
-            "autostart": self.autostart_var.get(),
+            "autostart": autostart,
             "platform": platform.system()
         }
         
@@ -255,6 +383,8 @@ label=USB Security
     
     def run(self):
         """Start the installer"""
+        if os.environ.get('USB_AUTH_STARTUP_PROBE'):
+            report_first_window(self.root)
         self.root.mainloop()
 
 if __name__ == "__main__":
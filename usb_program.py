@@ -5,10 +5,29 @@ import hashlib
 import uuid
 import json
 import time
+import signal
 import platform
 import logging
+import argparse
 from datetime import datetime
 from cryptography.fernet import Fernet
+from log_setup import configure_logging, HEARTBEAT_LOGGER
+from fileutil import CachedFile
+from metrics import registry, start_metrics_server
+from tracing import start_tracing
+from drive_discovery import find_backing_device, read_udev_data
+
+VERIFY_SECONDS = registry.histogram('usb_program_verify_seconds', "Time to verify the key the program runs from")
+KEY_EVENTS = registry.counter('usb_program_key_events_total', "Hotplug events received for the key")
+GRANTS = registry.counter('usb_program_grants_total', "Times access was granted")
+DENIES = registry.counter('usb_program_denies_total', "Times access was denied")
+
+# Routine verification results, kept out of the log while they repeat
+heartbeat_log = logging.getLogger(HEARTBEAT_LOGGER)
+
+# Stages timed with --trace
+TRACED_METHODS = ('check_usb', 'verify_usb', 'get_usb_identifier', 'grant_access', 'deny_access')
+TRACE_DUMP_FILE = 'usb_program_trace.json'
 
 # Platform-specific imports
 if platform.system() == 'Windows':
@@ -22,12 +41,31 @@ if platform.system() == 'Windows':
     import win32timezone
     import servicemanager
     import socket
+elif platform.system() == 'Linux':
+    try:
+        import pyudev
+    except ImportError:
+        pyudev = None
 
 class USBSecurityService:
     def __init__(self):
         self.running = True
         self.key_file = "security.key"
         self.config_file = "config.json"
+        # Parsed once and re-read only when changed on disk
+        self.security_key = CachedFile(self.key_file, bytes, bytes, mode=0o600)
+        self.config = CachedFile(self.config_file, json.loads, json.dumps, default={})
+        self.key_device = None
+        # Identity is cached only while hotplug events can invalidate it
+        self.cache_identity = False
+        self.usb_identifier = None
+        self.identity_hits = 0
+        self.identity_misses = 0
+        self.context = pyudev.Context() if platform.system() == 'Linux' and pyudev is not None else None
+        registry.collect('usb_program_identity_cache_hits_total', "Key identities served from the cache",
+                         lambda: self.identity_hits, 'counter')
+        registry.collect('usb_program_identity_cache_misses_total', "Key identities resolved from the system",
+                         lambda: self.identity_misses, 'counter')
         self.setup_logging()
         self.setup_platform_specific()
 
@@ -62,14 +100,28 @@ class USBSecurityService:
     def setup_logging(self):
         """Setup logging for the service"""
         log_file = os.path.join(os.path.dirname(os.path.abspath(__file__)), "usb_security.log")
-        logging.basicConfig(
-            filename=log_file,
-            level=logging.INFO,
-            format='%(asctime)s - %(levelname)s - %(message)s'
-        )
+        configure_logging(log_file, console=False)
+
+    def get_device_properties(self, path):
+        """Get udev properties of the block device holding a path without forking udevadm"""
+        dev = find_backing_device(path)
+        if self.context is not None:
+            return pyudev.Devices.from_device_number(self.context, 'block', dev).properties
+        return read_udev_data(f"{os.major(dev)}:{os.minor(dev)}")
 
     def get_usb_identifier(self):
         """Get unique identifier for the USB drive"""
+        if self.cache_identity and self.usb_identifier is not None:
+            self.identity_hits += 1
+            return self.usb_identifier
+        self.identity_misses += 1
+        identifier = self.resolve_usb_identifier()
+        if self.cache_identity:
+            self.usb_identifier = identifier
+        return identifier
+
+    def resolve_usb_identifier(self):
+        """Resolve unique identifier for the USB drive from the system"""
         try:
             if platform.system() == 'Windows':
                 # Windows-specific USB identification
@@ -79,8 +131,7 @@ class USBSecurityService:
             elif platform.system() == 'Linux':
                 # Linux-specific USB identification
                 device_path = os.path.realpath(os.path.dirname(os.path.abspath(__file__)))
-                device_info = os.popen(f"udevadm info -q property -n {device_path}").read()
-                serial = [line.split('=')[1] for line in device_info.split('\n') if 'ID_SERIAL=' in line][0]
+                serial = self.get_device_properties(device_path)['ID_SERIAL']
                 identifier = f"{serial}_{device_path}"
             elif platform.system() == 'Darwin':
                 # macOS-specific USB identification
@@ -93,50 +144,43 @@ class USBSecurityService:
                 identifier = str(uuid.uuid4())
             return identifier
         except Exception as e:
-            logging.error(f"Error getting USB identifier: {e}")
+            logging.error("Error getting USB identifier: %s", e)
             return None
 
     def generate_security_key(self):
         """Generate a new security key"""
         try:
             key = Fernet.generate_key()
-            with open(self.key_file, 'wb') as f:
-                f.write(key)
+            self.security_key.set(key)
             return key
         except Exception as e:
-            logging.error(f"Error generating security key: {e}")
+            logging.error("Error generating security key: %s", e)
             return None
 
     def load_security_key(self):
         """Load existing security key"""
         try:
-            if os.path.exists(self.key_file):
-                with open(self.key_file, 'rb') as f:
-                    return f.read()
-            return None
+            return self.security_key.get()
         except Exception as e:
-            logging.error(f"Error loading security key: {e}")
+            logging.error("Error loading security key: %s", e)
             return None
 
     def save_config(self, config):
         """Save configuration to file"""
         try:
-            with open(self.config_file, 'w') as f:
-                json.dump(config, f)
+            self.config.set(config)
             return True
         except Exception as e:
-            logging.error(f"Error saving config: {e}")
+            logging.error("Error saving config: %s", e)
             return False
 
     def load_config(self):
         """Load configuration from file"""
         try:
-            if os.path.exists(self.config_file):
-                with open(self.config_file, 'r') as f:
-                    return json.load(f)
-            return {}
+            # Copy so callers can modify it without touching the cached snapshot
+            return dict(self.config.get())
         except Exception as e:
-            logging.error(f"Error loading config: {e}")
+            logging.error("Error loading config: %s", e)
             return {}
 
     def verify_usb(self):
@@ -146,16 +190,16 @@ class USBSecurityService:
             if not usb_id:
                 return False
 
-            config = self.load_config()
+            config = self.config.get()
             if 'authorized_id' not in config:
                 # First time setup
-                config['authorized_id'] = usb_id
+                config = dict(config, authorized_id=usb_id)
                 self.save_config(config)
                 return True
 
             return config['authorized_id'] == usb_id
         except Exception as e:
-            logging.error(f"Error verifying USB: {e}")
+            logging.error("Error verifying USB: %s", e)
             return False
 
     def grant_access(self):
@@ -170,9 +214,11 @@ class USBSecurityService:
             elif platform.system() == 'Darwin':
                 # macOS-specific access granting
                 pass
-            logging.info("Access granted")
+            # Repeated every poll while the key stays put, so it is rate limited
+            heartbeat_log.info("Access granted")
+            GRANTS.inc()
         except Exception as e:
-            logging.error(f"Error granting access: {e}")
+            logging.error("Error granting access: %s", e)
 
     def deny_access(self):
         """Deny system access"""
@@ -187,10 +233,90 @@ class USBSecurityService:
                 # macOS-specific access denial
                 pass
             logging.info("Access denied")
+            DENIES.inc()
         except Exception as e:
-            logging.error(f"Error denying access: {e}")
+            logging.error("Error denying access: %s", e)
+
+    def events_available(self):
+        """Check whether kernel hotplug events can drive verification"""
+        return platform.system() == 'Linux' and pyudev is not None
+
+    def find_key_device(self, context):
+        """Find the block device backing the directory this program runs from"""
+        try:
+            program_dir = os.path.dirname(os.path.abspath(__file__))
+            return pyudev.Devices.from_device_number(context, 'block', find_backing_device(program_dir))
+        except Exception as e:
+            logging.error("Error finding key device: %s", e)
+            return None
+
+    def is_key_event(self, device):
+        """Check whether a hotplug event concerns the key's device"""
+        key = self.key_device
+        if key is None:
+            # Key location unknown, so every block event may matter
+            return True
+        if device.device_number and device.device_number == key.device_number:
+            return True
+        # Events for the parent disk or USB interface of the key partition
+        if key.sys_path.startswith(device.sys_path + '/') or device.sys_path.startswith(key.sys_path + '/'):
+            return True
+        serial = key.properties.get('ID_SERIAL')
+        return serial is not None and device.properties.get('ID_SERIAL') == serial
+
+    def check_usb(self):
+        """Run a single verification and apply the resulting access decision"""
+        start = time.perf_counter()
+        verified = self.verify_usb()
+        VERIFY_SECONDS.observe(time.perf_counter() - start)
+        if verified:
+            heartbeat_log.info("USB verification successful")
+            self.grant_access()
+        else:
+            logging.warning("USB verification failed")
+            self.deny_access()
+
+    def poll_loop(self):
+        """Verify the USB drive once every second"""
+        while self.running:
+            try:
+                self.check_usb()
+                time.sleep(1)  # Check every second
+            except Exception as e:
+                logging.error("Error in main loop: %s", e)
+                time.sleep(1)
 
-    def main(self):
+    def event_loop(self, heartbeat=None):
+        """Verify the USB drive whenever the kernel reports a change to it"""
+        context = self.context
+        monitor = pyudev.Monitor.from_netlink(context)
+        monitor.filter_by(subsystem='block')
+        # Subscribe before the first check so no event is missed in between
+        monitor.start()
+        self.key_device = self.find_key_device(context)
+        self.cache_identity = True
+        self.check_usb()
+
+        while self.running:
+            try:
+                device = monitor.poll(timeout=heartbeat)
+                if device is None:
+                    # Heartbeat timeout with no events: re-resolve the key so a
+                    # missed remove event cannot leave access granted
+                    self.usb_identifier = None
+                    self.check_usb()
+                elif device.action in ('add', 'remove', 'change') and self.is_key_event(device):
+                    KEY_EVENTS.inc()
+                    logging.info("Key device event: %s %s", device.action, device.device_path)
+                    self.usb_identifier = None
+                    if device.action == 'add':
+                        self.key_device = self.find_key_device(context) or self.key_device
+                    self.check_usb()
+            except Exception as e:
+                logging.error("Error in event loop: %s", e)
+                time.sleep(1)
+
+    def main(self, mode='auto', heartbeat=None):
         """Main service loop"""
         logging.info("USB Security Service started")
         
@@ -202,21 +328,36 @@ class USBSecurityService:
                 logging.error("Failed to initialize security key")
                 return
 
-        while self.running:
-            try:
-                # Check USB verification
-                if self.verify_usb():
-                    logging.info("USB verification successful")
-                    self.grant_access()
-                else:
-                    logging.warning("USB verification failed")
-                    self.deny_access()
-
-                time.sleep(1)  # Check every second
-            except Exception as e:
-                logging.error(f"Error in main loop: {e}")
-                time.sleep(1)
+        if mode == 'auto':
+            mode = 'events' if self.events_available() else 'poll'
+        if mode == 'events':
+            if not self.events_available():
+                logging.error("Event mode requires Linux with pyudev installed")
+                return
+            logging.info("Watching hotplug events (heartbeat: %s)", heartbeat or 'off')
+            self.event_loop(heartbeat)
+        else:
+            self.poll_loop()
 
 if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="USB security key verification")
+    parser.add_argument('--mode', choices=['auto', 'events', 'poll'], default='auto',
+                        help="verify on hotplug events or poll every second (default: auto)")
+    parser.add_argument('--heartbeat', type=float, default=None, metavar='SECONDS',
+                        help="re-verify at this interval even without events")
+    parser.add_argument('--metrics', metavar='ADDRESS',
+                        help="serve Prometheus metrics at HOST:PORT or a Unix socket path")
+    parser.add_argument('--trace', action='store_true',
+                        help=f"record verification spans; SIGUSR1 writes them to {TRACE_DUMP_FILE}")
+    parser.add_argument('--trace-file', metavar='PATH',
+                        help="also stream every span to PATH in Chrome trace format (implies --trace)")
+    args, _ = parser.parse_known_args()
     service = USBSecurityService()
-    service.main() 
\ No newline at end of file
+    if args.metrics:
+        start_metrics_server(args.metrics)
+    if args.trace or args.trace_file:
+        tracer = start_tracing(args.trace_file)
+        tracer.instrument(service, TRACED_METHODS)
+        if hasattr(signal, 'SIGUSR1'):
+            signal.signal(signal.SIGUSR1, lambda signum, frame: tracer.dump(TRACE_DUMP_FILE))
+    service.main(args.mode, args.heartbeat) 
\ No newline at end of file
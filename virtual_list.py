@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+import bisect
+import tkinter
+import customtkinter as ctk
+
+
+class PrefixIndex:
+    """Sorted strings supporting incremental updates and prefix ranges"""
+
+    def __init__(self, items=()):
+        self.items = sorted(set(items))
+
+    def add(self, item):
+        i = bisect.bisect_left(self.items, item)
+        if i == len(self.items) or self.items[i] != item:
+            self.items.insert(i, item)
+
+    def remove(self, item):
+        i = bisect.bisect_left(self.items, item)
+        if i < len(self.items) and self.items[i] == item:
+            del self.items[i]
+
+    def prefix_range(self, prefix):
+        """Get the [start, end) positions of items starting with prefix"""
+        if not prefix:
+            return 0, len(self.items)
+        return (bisect.bisect_left(self.items, prefix),
+                bisect.bisect_left(self.items, prefix + '\U0010ffff'))
+
+    def __len__(self):
+        return len(self.items)
+
+
+class VirtualList(ctk.CTkFrame):
+    """Scrollable, filterable list that only draws the rows in view.
+
+    Rows are a fixed pool of canvas text items re-labelled on scroll, so the
+    cost of a redraw depends on the widget height, not on the item count.
+    """
+
+    def __init__(self, master, height=200, row_height=22, empty_text="No items",
+                 on_select=None, **kwargs):
+        super().__init__(master, **kwargs)
+        self.row_height = row_height
+        self.empty_text = empty_text
+        self.on_select = on_select
+        self.index = PrefixIndex()
+        self.prefix = ''
+        self.start, self.end = 0, 0
+        self.top = 0
+        self.selected = None
+        self.rows = []
+
+        self.canvas = tkinter.Canvas(self, height=height, bg="#2b2b2b", highlightthickness=0)
+        self.scrollbar = ctk.CTkScrollbar(self, command=self._on_scrollbar)
+        self.scrollbar.pack(side="right", fill="y")
+        self.canvas.pack(side="left", fill="both", expand=True)
+        self.highlight = self.canvas.create_rectangle(0, 0, 0, 0, fill="#1f6aa5", width=0, state="hidden")
+
+        self.canvas.bind("<Configure>", lambda event: self._redraw())
+        self.canvas.bind("<MouseWheel>", self._on_wheel)
+        self.canvas.bind("<Button-4>", lambda event: self.scroll_to(self.top - 3))
+        self.canvas.bind("<Button-5>", lambda event: self.scroll_to(self.top + 3))
+        self.canvas.bind("<Button-1>", self._on_click)
+
+    def set_items(self, items):
+        """Replace all items"""
+        self.index = PrefixIndex(items)
+        if self.selected not in self.index.items:
+            self.selected = None
+        self._refilter()
+
+    def apply_diff(self, added=(), removed=()):
+        """Add and remove items without rebuilding the list"""
+        for item in removed:
+            self.index.remove(item)
+            if item == self.selected:
+                self.selected = None
+        for item in added:
+            self.index.add(item)
+        self._refilter()
+
+    def set_filter(self, prefix):
+        """Show only items starting with prefix"""
+        self.prefix = prefix
+        self.top = 0
+        self._refilter()
+
+    def visible_count(self):
+        """Number of items matching the filter"""
+        return self.end - self.start
+
+    def scroll_to(self, top):
+        self.top = max(0, min(top, self.visible_count() - self._page_rows() + 1))
+        self._redraw()
+
+    def _refilter(self):
+        self.start, self.end = self.index.prefix_range(self.prefix)
+        self.scroll_to(self.top)
+
+    def _page_rows(self):
+        return max(1, self.canvas.winfo_height() // self.row_height)
+
+    def _redraw(self):
+        page = self._page_rows() + 1
+        width = self.canvas.winfo_width()
+        while len(self.rows) < page:
+            self.rows.append(self.canvas.create_text(
+                6, len(self.rows) * self.row_height + self.row_height // 2,
+                anchor="w", fill="#dce4ee", font=("Helvetica", 11)
+            ))
+        count = self.visible_count()
+        self.canvas.itemconfigure(self.highlight, state="hidden")
+        for i, row in enumerate(self.rows):
+            position = self.start + self.top + i
+            if i < page and position < self.end:
+                item = self.index.items[position]
+                self.canvas.itemconfigure(row, text=item)
+                if item == self.selected:
+                    self.canvas.coords(self.highlight, 0, i * self.row_height, width, (i + 1) * self.row_height)
+                    self.canvas.itemconfigure(self.highlight, state="normal")
+            elif i == 0 and count == 0:
+                self.canvas.itemconfigure(row, text=self.empty_text)
+            else:
+                self.canvas.itemconfigure(row, text="")
+        if count:
+            self.scrollbar.set(self.top / count, min(1.0, (self.top + page - 1) / count))
+        else:
+            self.scrollbar.set(0.0, 1.0)
+
+    def _on_scrollbar(self, *args):
+        if args[0] == "moveto":
+            self.scroll_to(int(float(args[1]) * self.visible_count()))
+        elif args[0] == "scroll":
+            step = self._page_rows() if args[2] == "pages" else 1
+            self.scroll_to(self.top + int(args[1]) * step)
+
+    def _on_wheel(self, event):
+        self.scroll_to(self.top - int(event.delta / 120) * 3)
+
+    def _on_click(self, event):
+        position = self.start + self.top + event.y // self.row_height
+        if position < self.end:
+            self.selected = self.index.items[position]
+            self._redraw()
+            if self.on_select is not None:
+                self.on_select(self.selected)